@@ -0,0 +1,44 @@
+"""
+Porównanie `parse_date`/`parse_time` ze starą ścieżką opartą o `strptime`.
+
+Uruchamianie: python -m benchmarks.dates
+"""
+
+from datetime import datetime
+from timeit import repeat
+
+from utils.utils import parse_date, parse_time
+
+DATES = ["05.03.2025", "5-3-2025", "31.12.2025"]
+QUERIES = ["kolokwium", "egzamin z analizy", "##12"]  # tekst zamiast daty
+TIMES = ["12:30", "8:05"]
+NUMBER = 20_000
+
+
+def strptime_date(text: str):
+    try:
+        return datetime.strptime(text.replace("-", ".").replace("/", "."), "%d.%m.%Y")
+    except ValueError:
+        return None
+
+
+def strptime_time(text: str):
+    try:
+        return datetime.strptime(text, "%H:%M")
+    except ValueError:
+        return None
+
+
+def bench(name: str, func, inputs: list[str]):
+    best = min(repeat(lambda: [func(text) for text in inputs], number=NUMBER, repeat=5))
+    per_call = best / (NUMBER * len(inputs)) * 1e9
+    print(f"{name:<28}{per_call:>10.0f} ns/call")
+
+
+if __name__ == "__main__":
+    bench("strptime (dates)", strptime_date, DATES)
+    bench("parse_date (dates)", parse_date, DATES)
+    bench("strptime (text queries)", strptime_date, QUERIES)
+    bench("parse_date (text queries)", parse_date, QUERIES)
+    bench("strptime (times)", strptime_time, TIMES)
+    bench("parse_time (times)", parse_time, TIMES)
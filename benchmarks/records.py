@@ -0,0 +1,117 @@
+"""
+Pamięć i czas renderowania 10 tys. wydarzeń: instancje modelu `Event`
+vs `EventRecord` (krotki z bazy w obiektach ze slotami).
+
+Uruchamianie: python -m benchmarks.records
+"""
+
+import asyncio
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, time as dttime, timedelta
+from itertools import groupby
+from zoneinfo import ZoneInfo
+
+import discord
+
+os.chdir(tempfile.mkdtemp())
+os.mkdir("database")
+
+from extensions.calendar import DayField  # noqa: E402
+from orms.calendar import (  # noqa: E402
+    Event,
+    ArchivedEvent,
+    RecurringEvent,
+    database,
+    events_between,
+    start_timestamp,
+)
+from utils.utils import JSONTranslator  # noqa: E402
+
+GUILD_ID = 1
+EVENTS = 10_000
+DAYS = 365
+START = date(2025, 9, 29)
+TZ = ZoneInfo("Europe/Warsaw")
+
+
+def populate():
+    database.create_tables([Event, ArchivedEvent, RecurringEvent])
+    random.seed(0)
+    rows = []
+    for i in range(EVENTS):
+        day = START + timedelta(days=random.randrange(DAYS))
+        at = random.choice([None, dttime(8), dttime(10, 15), dttime(12)])
+        rows.append(
+            dict(
+                title=f"Kolokwium {i}",
+                message=random.choice([None, "Sala 101, przynieść kalkulator"]),
+                event_type=random.choice(["test", "exam", "deadline", "retake"]),
+                role_id=random.choice([None, *range(100, 130)]),
+                date=day,
+                time=at,
+                guild_id=GUILD_ID,
+                location=random.choice([None, "A1"]),
+                start_ts=start_timestamp(day, at, TZ),
+            )
+        )
+    with database.atomic():
+        for i in range(0, len(rows), 500):
+            Event.insert_many(rows[i : i + 500]).execute()
+
+
+def load_models() -> list:
+    # dotychczasowa ścieżka odczytu
+    return list(
+        Event.select().where(Event.guild_id == GUILD_ID).order_by(Event.start_ts)
+    )
+
+
+def load_records() -> list:
+    return list(events_between(GUILD_ID, START, START + timedelta(days=DAYS), tz=TZ))
+
+
+def memory(load) -> int:
+    gc.collect()
+    tracemalloc.start()
+    events = load()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(events) == EVENTS
+    return size
+
+
+async def render(events: list):
+    translator = JSONTranslator()
+    fields = []
+    for day, day_events in groupby(events, key=lambda event: event.date):
+        field = DayField(translator, discord.Locale.polish, True)
+        await field._init(datetime.combine(day, dttime.min), list(day_events))
+        fields.append(field)
+    return fields
+
+
+def bench(name: str, load, number: int = 5):
+    print(f"{name:<16}{memory(load) / 1024 / 1024:>10.2f} MiB / {EVENTS} events")
+    best_load = best_render = float("inf")
+    for _ in range(number):
+        started = time.perf_counter()
+        events = load()
+        loaded = time.perf_counter()
+        asyncio.run(render(events))
+        best_load = min(best_load, loaded - started)
+        best_render = min(best_render, time.perf_counter() - loaded)
+    print(
+        f"{'':<16}{best_load * 1e3:>10.2f} ms load"
+        f"  {best_render * 1e3:.2f} ms render"
+    )
+
+
+if __name__ == "__main__":
+    populate()
+    bench("Event models", load_models)
+    bench("EventRecord", load_records)
@@ -0,0 +1,311 @@
+"""
+Odtwarza nagrane interakcje (zob. `record_interactions` w configu) na cogach
+Calendar i Config bez połączenia z Discordem, na kopii bazy danych.
+
+Uruchamianie: python -m benchmarks.replay logs/interactions.jsonl --speed 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Optional
+
+import discord
+
+# typy opcji komend z dokumentacji Discorda
+OPTION_CHANNEL = 7
+OPTION_ROLE = 8
+OPTION_MENTIONABLE = 9
+
+# Discord wymaga odpowiedzi na interakcję w ciągu 3 sekund
+ACK_DEADLINE = 3.0
+
+
+class Call:
+    """Timing of one replayed interaction."""
+
+    def __init__(self, command: str):
+        self.command = command
+        self.start = time.perf_counter()
+        self.ack: Optional[float] = None
+        self.done: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def acknowledge(self):
+        if self.ack is None:
+            self.ack = time.perf_counter() - self.start
+
+
+class StubMessage:
+    def __init__(self, **kwargs):
+        self.id = 0
+        self.embeds = kwargs.get("embeds") or (
+            [kwargs["embed"]] if kwargs.get("embed") else []
+        )
+        self.attachments = []
+
+    async def delete(self):
+        pass
+
+
+class StubResponse:
+    def __init__(self, call: Call):
+        self.call = call
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self, *args, **kwargs):
+        if self._done:
+            raise discord.InteractionResponded(None)
+        self._done = True
+        self.call.acknowledge()
+
+    send_message = defer = edit_message = _respond
+
+
+class StubFollowup:
+    def __init__(self, call: Call):
+        self.call = call
+
+    async def send(self, *args, **kwargs) -> StubMessage:
+        self.call.acknowledge()
+        return StubMessage(**kwargs)
+
+
+class StubChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+
+    def permissions_for(self, member) -> discord.Permissions:
+        return discord.Permissions.all()
+
+
+class StubInteraction:
+    type = discord.InteractionType.application_command
+
+    def __init__(self, record: dict, call: Call):
+        self.guild_id = record["guild_id"]
+        self.guild = SimpleNamespace(
+            id=self.guild_id, name=str(self.guild_id), icon=None, me=None, shard_id=0
+        )
+        # nagranie nie zawiera ról użytkownika, więc jak w discord.py zostaje
+        # tylko @everyone (z id serwera)
+        self.user = SimpleNamespace(
+            id=0,
+            mention="<@0>",
+            guild_permissions=discord.Permissions.all(),
+            roles=[discord.Object(self.guild_id)],
+        )
+        self.locale = discord.Locale.polish
+        self.data = {}
+        self.message = None
+        self.channel = None
+        self.extras = {}
+        self.call = call
+        self.response = StubResponse(call)
+        self.followup = StubFollowup(call)
+
+    async def edit_original_response(self, **kwargs) -> StubMessage:
+        self.call.acknowledge()
+        return StubMessage(**kwargs)
+
+    async def delete_original_response(self):
+        pass
+
+
+def option_value(option: dict):
+    if option["value"] is None:
+        return None
+    if option["type"] == OPTION_CHANNEL:
+        return StubChannel(int(option["value"]))
+    if option["type"] in (OPTION_ROLE, OPTION_MENTIONABLE):
+        return discord.Object(int(option["value"]))
+    return option["value"]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def build_client():
+    from discord import app_commands
+
+    from extensions.calendar import Calendar
+    from extensions.config import Config
+    from utils.discord_extension import AuditLog, AutoDefer, SendQueue
+    from utils.utils import JSONTranslator
+
+    translator = JSONTranslator()
+    await translator.load()
+    client = SimpleNamespace(
+        tree=SimpleNamespace(translator=translator),
+        bot_config={},
+        user=SimpleNamespace(
+            avatar=SimpleNamespace(url="https://cdn.discordapp.com/embed/avatars/0.png")
+        ),
+        guilds=[],
+        leader=SimpleNamespace(try_acquire=lambda: False),
+        send_queue=SendQueue(),
+    )
+    client.send_queue.start()
+    client.auto_defer = AutoDefer(client.send_queue)
+    client.audit_log = AuditLog(client.send_queue, translator, lambda guild_id: None)
+
+    cogs = [Calendar(client), Config(client)]
+    client.get_cog = {type(cog).__name__: cog for cog in cogs}.get
+    commands = {}
+    for cog in cogs:
+        await cog.cog_load()
+        for command in cog.walk_app_commands():
+            if isinstance(command, app_commands.Command):
+                commands[command.qualified_name] = command
+    return client, cogs, commands
+
+
+async def replay(records: list[dict], speed: float, concurrency: int):
+    client, cogs, commands = await build_client()
+    calls: list[Call] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(record: dict):
+        async with semaphore:
+            call = Call(record["command"])
+            calls.append(call)
+            try:
+                command = commands[record["command"]]
+                params = {
+                    param.display_name: param.name for param in command.parameters
+                }
+                kwargs = {
+                    params[option["name"]]: option_value(option)
+                    for option in record["options"]
+                }
+                await command.callback(
+                    command.binding, StubInteraction(record, call), **kwargs
+                )
+            except Exception as e:
+                call.error = type(e).__name__
+                if len([c for c in calls if c.error]) <= 3:
+                    traceback.print_exc()
+            call.done = time.perf_counter() - call.start
+
+    first = records[0]["t"]
+    started = time.perf_counter()
+    tasks = []
+    for record in records:
+        if speed > 0:
+            delay = (record["t"] - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run(record)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    for cog in cogs:
+        await cog.cog_unload()
+    client.send_queue.stop()
+    # AutoDefer liczy odroczenia według nazw funkcji, nie nazw komend
+    defers = {
+        name: client.auto_defer.defers[command.callback.__qualname__]
+        for name, command in commands.items()
+    }
+    report(records, calls, elapsed, defers)
+
+
+def report(
+    records: list[dict], calls: list[Call], elapsed: float, defers: dict[str, int]
+):
+    done = [call.done for call in calls]
+    acks = [call.ack for call in calls if call.ack is not None]
+    errors = Counter(call.error for call in calls if call.error)
+    print(
+        f"{len(calls)} interactions from {len({r['guild_id'] for r in records})} guilds"
+        f" in {elapsed:.2f}s: {len(calls) / elapsed:.1f}/s"
+    )
+    print(
+        f"latency p50 {percentile(done, 0.5) * 1000:.1f}ms"
+        f" p90 {percentile(done, 0.9) * 1000:.1f}ms"
+        f" p99 {percentile(done, 0.99) * 1000:.1f}ms"
+        f" max {max(done, default=0) * 1000:.1f}ms"
+    )
+    late = sum(1 for call in calls if call.ack is None or call.ack > ACK_DEADLINE)
+    print(
+        f"ack p99 {percentile(acks, 0.99) * 1000:.1f}ms,"
+        f" late or missing acks: {late}"
+    )
+    print(f"errors: {sum(errors.values())} ({sum(errors.values()) / len(calls):.1%})")
+    for error, count in errors.most_common():
+        print(f"  {error}: {count}")
+
+    per_command = defaultdict(list)
+    for call in calls:
+        per_command[call.command].append(call)
+    print(
+        f"\n{'command':<60}{'count':>7}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}"
+        f"{'defers':>8}"
+    )
+    for command, command_calls in sorted(per_command.items()):
+        times = [call.done for call in command_calls]
+        print(
+            f"{command:<60}{len(command_calls):>7}"
+            f"{percentile(times, 0.5) * 1000:>9.1f}"
+            f"{percentile(times, 0.99) * 1000:>9.1f}"
+            f"{sum(1 for call in command_calls if call.error):>8}"
+            f"{defers.get(command, 0):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("recording", help="JSONL file written by InteractionRecorder")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="time multiplier, 0 replays everything at once",
+    )
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--database", default="database", help="directory copied before the replay"
+    )
+    args = parser.parse_args()
+
+    with open(args.recording, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        sys.exit("empty recording")
+
+    # cogi i modele używają ścieżek względnych, więc podmieniamy katalog roboczy
+    # na kopię bazy i tłumaczeń; oryginalna baza nie jest zmieniana
+    root = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    shutil.copytree(args.database, os.path.join(workdir, "database"))
+    os.mkdir(os.path.join(workdir, "configs"))
+    shutil.copy(
+        os.path.join(root, "configs", "langs.json"), os.path.join(workdir, "configs")
+    )
+    sys.path.insert(0, root)
+    os.chdir(workdir)
+    try:
+        asyncio.run(replay(records, args.speed, args.concurrency))
+    finally:
+        os.chdir(root)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Czas liczenia `/calendar statystyki` dla roku akademickiego dużego serwera:
+zapytanie agregujące + operacje NumPy vs pętla po instancjach modelu.
+
+Uruchamianie: python -m benchmarks.stats
+"""
+
+import os
+import random
+import tempfile
+from collections import Counter
+from datetime import date, time, timedelta
+from timeit import repeat
+from zoneinfo import ZoneInfo
+
+os.chdir(tempfile.mkdtemp())
+os.mkdir("database")
+
+from orms.calendar import (  # noqa: E402
+    Event,
+    ArchivedEvent,
+    RecurringEvent,
+    database,
+    event_counts,
+    start_timestamp,
+)
+from utils.stats import CalendarStats  # noqa: E402
+
+GUILD_ID = 1
+EVENTS = 5_000
+WEEKS = 52
+START = date(2025, 9, 29)
+TZ = ZoneInfo("Europe/Warsaw")
+
+
+def populate():
+    database.create_tables([Event, ArchivedEvent, RecurringEvent])
+    random.seed(0)
+    rows = []
+    for _ in range(EVENTS):
+        day = START + timedelta(days=random.randrange(WEEKS * 7))
+        rows.append(
+            dict(
+                title="Kolokwium",
+                event_type=random.choice(["test", "exam", "deadline", "retake"]),
+                role_id=random.choice([None, *range(100, 130)]),
+                date=day,
+                time=time(10),
+                guild_id=GUILD_ID,
+                start_ts=start_timestamp(day, time(10), TZ),
+            )
+        )
+    with database.atomic():
+        for i in range(0, len(rows), 500):
+            Event.insert_many(rows[i : i + 500]).execute()
+
+
+def numpy_stats():
+    end = START + timedelta(weeks=WEEKS, days=-1)
+    stats = CalendarStats(START, WEEKS, event_counts(GUILD_ID, START, end, TZ))
+    return stats.busiest_weeks(), stats.exam_density()
+
+
+def loop_stats():
+    per_week = Counter()
+    per_role = Counter()
+    for event in Event.select().where(Event.guild_id == GUILD_ID):
+        week = (event.date - START).days // 7
+        per_week[week] += 1
+        if event.event_type in ("test", "exam", "retake"):
+            per_role[event.role_id] += 1
+    return per_week.most_common(3), per_role.most_common()
+
+
+def bench(name: str, func, number: int = 20):
+    best = min(repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<28}{best * 1e3:>10.2f} ms/call")
+
+
+if __name__ == "__main__":
+    populate()
+    bench("loop over models", loop_stats)
+    bench("aggregate + numpy", numpy_stats)
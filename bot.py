@@ -1,8 +1,10 @@
+import asyncio
 import json
 import os
 import logging
 import datetime
 import random
+import signal
 
 
 # discord import
@@ -11,8 +13,21 @@ from discord.ext import commands, tasks
 
 # local import
 from utils.utils import JSONTranslator
-from orms.calendar import Event
-from orms.configs import GuildConfigs
+from utils.interaction_recorder import InteractionRecorder
+from utils.leader import LeaderLock
+from utils.loop_monitor import LoopMonitor
+from utils.discord_extension import AuditLog, AutoDefer, SendQueue
+from utils.snapshot import read_snapshot, write_snapshot
+from orms.calendar import (
+    Event,
+    ArchivedEvent,
+    RecurringEvent,
+    GuildDataVersion,
+    Subscription,
+    data_versions,
+)
+from orms.configs import GuildConfigs, cached_timezones, preload_timezones
+from orms.migrations import run_migrations
 
 ### wymagane permisje ###
 # - wysyłanie wiadomości
@@ -23,8 +38,15 @@ from orms.configs import GuildConfigs
 
 # ray.init(object_store_memory=78643200)
 
+# ustawiane przez cluster.py dla każdego procesu
+CLUSTER_ID = os.environ.get("WITELONEK_CLUSTER_ID")
+
 logger = logging.getLogger("discord")
-handler = logging.FileHandler(filename="logs/bot.log", encoding="utf-8", mode="a+")
+handler = logging.FileHandler(
+    filename=f"logs/bot-{CLUSTER_ID}.log" if CLUSTER_ID else "logs/bot.log",
+    encoding="utf-8",
+    mode="a+",
+)
 
 bot_config = json.load(open(os.path.join("configs", "config.json"), "r+"))
 
@@ -32,41 +54,203 @@ MY_GUILD = discord.Object(id=bot_config["test_guild"])
 # MY_GUILD = discord.Object(id=891009215102074950)
 WITELON_DISCORD = discord.Object(id=1294922610957746216)
 
-if not Event.table_exists():
-    Event.create_table()
-if not GuildConfigs.table_exists():
-    GuildConfigs.create_table()
+# procesy renderujące (spawn) importują ten plik jako __mp_main__, więc bazy,
+# klient i połączenie z Discordem powstają tylko przy uruchomieniu
+if __name__ == "__main__":
+    if not Event.table_exists():
+        Event.create_table()
+    if not ArchivedEvent.table_exists():
+        ArchivedEvent.create_table()
+    if not RecurringEvent.table_exists():
+        RecurringEvent.create_table()
+    if not GuildDataVersion.table_exists():
+        GuildDataVersion.create_table()
+    if not Subscription.table_exists():
+        Subscription.create_table()
+    if not GuildConfigs.table_exists():
+        GuildConfigs.create_table()
+    run_migrations()
 
 
 last_status = None
 
+# "sharding": {"enabled": true, "shard_count": 4, "shard_ids": [0, 1]}
+# shard_count/shard_ids są opcjonalne, bez nich discord.py dobiera je sam
+sharding = bot_config.get("sharding") or {}
+if os.environ.get("WITELONEK_SHARD_IDS"):
+    sharding = {
+        "enabled": True,
+        "shard_count": int(os.environ["WITELONEK_SHARD_COUNT"]),
+        "shard_ids": [int(i) for i in os.environ["WITELONEK_SHARD_IDS"].split(",")],
+    }
+BaseBot = commands.AutoShardedBot if sharding.get("enabled") else commands.Bot
+
+# stan pamięci podręcznych zapisywany przy zamykaniu i wczytywany przy starcie
+SNAPSHOT_PATH = bot_config.get("snapshot_path") or os.path.join(
+    "database",
+    f"warm_start-{CLUSTER_ID}.json.gz" if CLUSTER_ID else "warm_start.json.gz",
+)
+
+
+def bootstrap_guild_configs(guilds: list[discord.Guild], known_guilds: set[int]):
+    # known_guilds to serwery skonfigurowane w tym procesie; wstawianie ignoruje
+    # istniejące wiersze, więc nie polega na migawce z poprzedniego uruchomienia
+    guilds = [guild for guild in guilds if guild.id not in known_guilds]
+    for offset in range(0, len(guilds), 500):
+        GuildConfigs.insert_many(
+            [{"guild_id": guild.id} for guild in guilds[offset : offset + 500]]
+        ).on_conflict_ignore().execute()
+    known_guilds.update(guild.id for guild in guilds)
+
 
-class MyClient(commands.Bot):
+class MyClient(BaseBot):
     def __init__(self, *, intents: discord.Intents):
+        shard_options = (
+            {
+                "shard_count": sharding.get("shard_count"),
+                "shard_ids": sharding.get("shard_ids"),
+            }
+            if sharding.get("enabled")
+            else {}
+        )
         super().__init__(
             command_prefix=bot_config["prefix"],
             intents=intents,
             status=discord.Status.online,
             help_command=None,
+            # dłuższe blokady zgłaszane jako discord.RateLimited, żeby kolejka
+            # wysyłek mogła spowolnić trasę (krótsze przeczekuje discord.py)
+            max_ratelimit_timeout=bot_config.get("max_ratelimit_timeout", 30),
+            **shard_options,
         )
         self.bot_config = bot_config
+        self.leader = LeaderLock(bot_config.get("leader_lock", "database/leader.lock"))
+        self.known_guilds: set[int] = set()
+        self.shutdown_task: asyncio.Task | None = None
 
     async def setup_hook(self):
-        await self.tree.set_translator(translator=JSONTranslator())
+        warm_state = read_snapshot(SNAPSHOT_PATH) or {}
+        versions = data_versions()
+        translator = JSONTranslator()
+        if warm_state.get("translations"):
+            translator.preload(**warm_state["translations"])
+        await self.tree.set_translator(translator=translator)
+        preload_timezones(
+            {
+                guild_id: timezone
+                for guild_id, version, timezone in warm_state.get("timezones", [])
+                if versions.get(guild_id, 0) == version
+            }
+        )
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            asyncio.get_running_loop().add_signal_handler(
+                signum, lambda: asyncio.create_task(self.close())
+            )
+        # "loop_monitor": {"interval": 0.25, "threshold": 0.1}
+        self.loop_monitor = LoopMonitor(**(bot_config.get("loop_monitor") or {}))
+        self.loop_monitor.start()
+        self.send_queue = SendQueue()
+        self.send_queue.start()
+        # "auto_defer": {"threshold": 1.5, "predict": 1.0}
+        self.auto_defer = AutoDefer(
+            self.send_queue, **(bot_config.get("auto_defer") or {})
+        )
+        self.audit_log = AuditLog(
+            self.send_queue,
+            self.tree.translator,
+            self.logging_channel,
+            interval=bot_config.get("audit_log_interval", 5),
+        )
+        # "record_interactions": {"path": "logs/interactions.jsonl", "sample_rate": 1}
+        # nagrania odtwarza python -m benchmarks.replay
+        record_config = bot_config.get("record_interactions")
+        self.recorder = InteractionRecorder(**record_config) if record_config else None
 
         for filename in os.listdir("./extensions"):
             if filename.endswith(".py"):
                 await self.load_extension(f"extensions.{filename[:-3]}")
+        for name, cog in self.cogs.items():
+            if hasattr(cog, "restore_state") and name in warm_state.get("cogs", {}):
+                cog.restore_state(warm_state["cogs"][name], versions)
 
         self.tree.copy_global_to(guild=WITELON_DISCORD)
         self.tree.copy_global_to(guild=MY_GUILD)
-        await self.tree.sync()
+        if CLUSTER_ID in (None, "0"):
+            await self.tree.sync()
+
+    def warm_state(self) -> dict:
+        versions = data_versions()
+        return {
+            "translations": {
+                "translations": self.tree.translator.translations,
+                "stamp": self.tree.translator.stamp,
+            },
+            "timezones": [
+                [guild_id, versions.get(guild_id, 0), timezone]
+                for guild_id, timezone in cached_timezones().items()
+            ],
+            "cogs": {
+                name: cog.snapshot_state()
+                for name, cog in self.cogs.items()
+                if hasattr(cog, "snapshot_state")
+            },
+        }
+
+    async def close(self):
+        # sygnał i wyjście z client.run wołają close, oba czekają na to samo zamknięcie
+        if self.shutdown_task is None:
+            self.shutdown_task = asyncio.create_task(self.shutdown())
+        await self.shutdown_task
+
+    async def shutdown(self):
+        logger.info("========== shutting down ==========")
+        # bez setup_hook (np. nieudane logowanie) nie ma czego zapisywać
+        if hasattr(self, "send_queue"):
+            self.loop_monitor.stop()
+            await self.audit_log.flush_all()
+            if not await self.send_queue.drain(bot_config.get("shutdown_timeout", 10)):
+                logger.warning("send queue not drained before shutdown")
+            self.send_queue.stop()
+            if self.recorder:
+                self.recorder.close()
+            try:
+                write_snapshot(SNAPSHOT_PATH, self.warm_state())
+            except Exception as e:
+                logger.warning(f"warm start snapshot not written: {e}")
+        await super().close()
+        Event._meta.database.close()
+        GuildConfigs._meta.database.close()
+
+    def logging_channel(self, guild_id: int):
+        guild_config = GuildConfigs.get_or_none(GuildConfigs.guild_id == guild_id)
+        if not guild_config or not guild_config.logging_channel_id:
+            return None
+        return self.get_channel(guild_config.logging_channel_id)
+
+    async def on_interaction(self, interaction: discord.Interaction):
+        if self.recorder:
+            self.recorder.record(interaction)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        # konfiguracja jest usuwana (cog Maintenance), więc po ponownym dodaniu
+        # bota bootstrap_guild_configs musi ją utworzyć od nowa
+        self.known_guilds.discard(guild.id)
+
+    async def on_guild_join(self, guild: discord.Guild):
+        bootstrap_guild_configs([guild], set())
+
+    async def on_shard_ready(self, shard_id: int):
+        bootstrap_guild_configs(
+            [guild for guild in self.guilds if guild.shard_id == shard_id],
+            self.known_guilds,
+        )
+        logger.info(f"========== shard {shard_id} is ready ==========")
 
     async def on_ready(self):
-        for guild in self.guilds:
-            if GuildConfigs.get_or_none(GuildConfigs.guild_id == guild.id) is None:
-                GuildConfigs.create(guild_id=guild.id)
-        change_status.start()
+        if not sharding.get("enabled"):
+            bootstrap_guild_configs(self.guilds, self.known_guilds)
+        if not change_status.is_running():
+            change_status.start()
         self.startTime = datetime.datetime.now()
         # print("ready")
         logger.info("========== bot is ready ==========")
@@ -85,15 +269,22 @@ async def change_status():
     last_status = selected_status
 
 
-intents = discord.Intents.all()
-client = MyClient(intents=intents)
-
-client.local_config = bot_config
-
+if __name__ == "__main__":
+    intents = discord.Intents.all()
+    client = MyClient(intents=intents)
 
-@client.command()
-async def ping(ctx: commands.Context):
-    await ctx.send(f"Ping: {round(client.latency*1000)}ms")
+    client.local_config = bot_config
 
+    @client.command()
+    async def ping(ctx: commands.Context):
+        if sharding.get("enabled"):
+            await ctx.send(
+                "\n".join(
+                    f"Shard {shard_id}: {round(latency*1000)}ms"
+                    for shard_id, latency in client.latencies
+                )
+            )
+            return
+        await ctx.send(f"Ping: {round(client.latency*1000)}ms")
 
-client.run(bot_config["token"], log_handler=handler, log_level=logging.INFO)
+    client.run(bot_config["token"], log_handler=handler, log_level=logging.INFO)
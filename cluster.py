@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+### uruchamianie kilku procesów bota ###
+# "cluster": {"processes": 2, "shard_count": 4}
+# każdy proces dostaje swój zakres shardów, zadania globalne (np. archiwizacja)
+# wykonuje tylko proces trzymający LeaderLock
+#######################
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [cluster] %(message)s")
+logger = logging.getLogger("cluster")
+
+bot_config = json.load(open(os.path.join("configs", "config.json"), "r"))
+cluster_config = bot_config.get("cluster") or {}
+
+PROCESSES = int(cluster_config.get("processes", 2))
+SHARD_COUNT = int(cluster_config.get("shard_count", PROCESSES))
+RESTART_DELAY = 5
+
+
+def shard_ranges(processes: int, shard_count: int) -> list[list[int]]:
+    return [list(range(shard_count))[i::processes] for i in range(processes)]
+
+
+def spawn(cluster_id: int, shard_ids: list[int]) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WITELONEK_CLUSTER_ID=str(cluster_id),
+        WITELONEK_SHARD_COUNT=str(SHARD_COUNT),
+        WITELONEK_SHARD_IDS=",".join(map(str, shard_ids)),
+    )
+    logger.info(f"starting cluster {cluster_id} with shards {shard_ids}")
+    return subprocess.Popen([sys.executable, "bot.py"], env=env)
+
+
+def main():
+    if PROCESSES > SHARD_COUNT:
+        raise ValueError("cluster.processes cannot exceed cluster.shard_count")
+
+    ranges = shard_ranges(PROCESSES, SHARD_COUNT)
+    workers = {i: spawn(i, shard_ids) for i, shard_ids in enumerate(ranges)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for worker in workers.values():
+            worker.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        for cluster_id, worker in workers.items():
+            if worker.poll() is None or stopping:
+                continue
+            logger.info(
+                f"cluster {cluster_id} exited with {worker.returncode}, restarting"
+            )
+            time.sleep(RESTART_DELAY)
+            # sygnał w trakcie przerwy: nowy proces nie dostałby już SIGTERM
+            if stopping:
+                break
+            workers[cluster_id] = spawn(cluster_id, ranges[cluster_id])
+        time.sleep(1)
+
+    # procesy uruchomione w trakcie obsługi sygnału też muszą się zamknąć
+    for worker in workers.values():
+        if worker.poll() is None:
+            worker.send_signal(signal.SIGTERM)
+    for worker in workers.values():
+        worker.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
-from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date as dtdate, datetime, timedelta
 from datetime import time as dttime
-from typing import Literal, Optional
+from io import BytesIO
+from itertools import groupby
+from typing import Awaitable, Callable, Iterable, Literal, Optional
+from zoneinfo import ZoneInfo
 from peewee import fn
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -12,16 +22,47 @@ from discord.app_commands import locale_str
 from discord.ext import commands
 
 # local import
-from utils.utils import JSONTranslator, pretty_traceback, datetime_to_words
-from utils.discord_extension import ExtEmbedGenerator, ExtView
-from orms.calendar import Event
-from orms.configs import GuildConfigs
-
-
-class PastDateError(Exception): ...
-
-
-class FarDateError(Exception): ...
+from utils.utils import (
+    JSONTranslator,
+    pretty_traceback,
+    datetime_to_words,
+    next_daily,
+    next_weekly,
+    parse_date,
+    parse_time,
+)
+from utils.discord_extension import (
+    ExtEmbedGenerator,
+    ExtView,
+    Priority,
+    attachment_expired,
+    defer_first,
+)
+from utils.month_image import TYPE_COLORS, render_month
+from utils.search import TrigramIndex, event_text
+from utils.single_flight import GuildLimiter, SingleFlight
+from utils.timer_heap import TimerHeap
+from utils.stats import CalendarStats
+from orms.calendar import (
+    Event,
+    EventRecord,
+    RecurringEvent,
+    archive_events,
+    bump_data_version,
+    data_version,
+    event_counts,
+    events_between,
+    find_conflicts,
+    get_event,
+    record_deliveries,
+    start_timestamp,
+    subscribe,
+    subscribers,
+    subscription_matches,
+    unsubscribe,
+    user_subscriptions,
+)
+from orms.configs import GuildConfigs, guild_timezone
 
 
 class InvalidDateError(Exception): ...
@@ -34,6 +75,18 @@ EVENT_TYPES = Literal[
     "calendar_type_retake",
 ]
 
+REPEAT_TYPES = Literal[
+    "calendar_repeat_weekly",
+    "calendar_repeat_biweekly",
+]
+
+# liczba obrazów miesiąca trzymanych w pamięci
+MONTH_IMAGE_CACHE_SIZE = 32
+# liczba wyrenderowanych tygodni (serwer, dzień początkowy) trzymanych w pamięci
+WEEK_AGENDA_CACHE_SIZE = 256
+# liczba statystyk (serwer, początek, liczba tygodni) trzymanych w pamięci
+STATS_CACHE_SIZE = 256
+
 
 class Calendar(commands.Cog):
     def __init__(self, client: commands.Bot):
@@ -42,13 +95,224 @@ class Calendar(commands.Cog):
             translator=client.tree.translator, locale=discord.Locale.polish
         )
         self.translate = self.client.tree.translator.translate
+        self.bot_config = client.bot_config or {}
+        # guild_id -> (wersja danych, gotowe wiadomości podsumowania tygodnia)
+        # guild_id -> (wersja danych, dzień wysłania, wiadomości)
+        self.digests: dict[int, tuple[int, dtdate, list[list[discord.Embed]]]] = {}
+        # guild_id -> indeks trygramowy tytułów i wiadomości wydarzeń
+        self.search_indexes: dict[int, TrigramIndex] = {}
+        # (guild_id, początek, liczba tygodni) -> (wersja danych, statystyki)
+        self.stats_cache: OrderedDict[
+            tuple[int, dtdate, int], tuple[int, CalendarStats]
+        ] = OrderedDict()
+        # (guild_id, pierwszy dzień) -> (wersja danych, wiadomości z tygodniem)
+        self.week_agendas: OrderedDict[
+            tuple[int, dtdate], tuple[int, list[list[discord.Embed]]]
+        ] = OrderedDict()
+        # hash danych miesiąca -> (PNG, link do wysłanego załącznika)
+        self.month_images: OrderedDict[str, tuple[bytes, Optional[str]]] = OrderedDict()
+        # identyczne równoczesne zapytania ciężkich komend liczą się raz,
+        # a różne na jednym serwerze maks. po `heavy_command_limit` naraz
+        self.flights = SingleFlight()
+        self.heavy_limit = GuildLimiter(self.bot_config.get("heavy_command_limit", 2))
+        # ("precompute" | "send", guild_id) -> najbliższe podsumowanie tygodnia
+        self.digest_timers = TimerHeap(
+            self.fire_digest, self.bot_config.get("digest_concurrency", 4)
+        )
+        # guild_id -> moment (monotonic), po którym odświeżyć przypiętą agendę
+        self.agenda_due: dict[int, float] = {}
+        self.agenda_timers: dict[int, asyncio.Task] = {}
+        self.agenda_locks: defaultdict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # guild_id -> lokalna data, od której wyrenderowano przypiętą agendę
+        self.agenda_dates: dict[int, dtdate] = {}
+
+    async def cog_load(self):
+        self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_job(
+            self.archive_old_events, CronTrigger(hour=4), id="archive_old_events"
+        )
+        # co kwadrans, bo północ w strefach serwerów nie musi wypadać o pełnej godzinie
+        self.scheduler.add_job(
+            self.roll_over_agendas, CronTrigger(minute="*/15"), id="roll_over_agendas"
+        )
+        self.scheduler.start()
+        self.digest_timers.start()
+        # spawn zamiast fork: proces bota ma już wątki (to_thread, monitor pętli)
+        # i otwarte połączenia SQLite, których kopia w procesie potomnym
+        # mogłaby się zakleszczyć albo uszkodzić bazę
+        self.render_pool = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+        # uruchomienie procesu roboczego od razu, nie przy pierwszym renderze
+        self.render_pool.submit(int)
+
+    async def cog_unload(self):
+        self.scheduler.shutdown(wait=False)
+        self.digest_timers.stop()
+        for timer in self.agenda_timers.values():
+            timer.cancel()
+        self.render_pool.shutdown(wait=False, cancel_futures=True)
+
+    def schedule_week_digest(self, shard_id: Optional[int] = None):
+        self.schedule_digests(
+            [
+                guild.id
+                for guild in self.client.guilds
+                if shard_id is None or guild.shard_id == shard_id
+            ]
+        )
 
     @commands.Cog.listener()
     async def on_ready(self):
-        scheduler = AsyncIOScheduler()
-        scheduler.add_job(self.send_show_week, CronTrigger(day_of_week=6, hour=12))
-        # scheduler.add_job(self.send_show_week, IntervalTrigger(seconds=5))
-        scheduler.start()
+        if not isinstance(self.client, commands.AutoShardedBot):
+            self.schedule_week_digest()
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id: int):
+        # każdy shard wysyła podsumowanie tylko dla swoich serwerów
+        self.schedule_week_digest(shard_id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        # dane serwera usuwa cog Maintenance, tu zwalniamy tylko pamięć
+        self.digests.pop(guild.id, None)
+        self.search_indexes.pop(guild.id, None)
+        for kind in ("precompute", "send", "remind"):
+            self.digest_timers.cancel((kind, guild.id))
+        for cache in (self.stats_cache, self.week_agendas):
+            for key in [key for key in cache if key[0] == guild.id]:
+                del cache[key]
+
+    # region Warm start
+    def snapshot_state(self) -> dict:
+        def dump(messages: list[list[discord.Embed]]):
+            return [[embed.to_dict() for embed in embeds] for embeds in messages]
+
+        return {
+            "week_agendas": [
+                [guild_id, day.isoformat(), version, dump(messages)]
+                for (guild_id, day), (version, messages) in self.week_agendas.items()
+                # minione tygodnie nie będą już oglądane
+                if day >= datetime.now().date() - timedelta(days=1)
+            ],
+            "week_digests": [
+                [guild_id, version, day.isoformat(), dump(messages)]
+                for guild_id, (version, day, messages) in self.digests.items()
+            ],
+        }
+
+    def restore_state(self, state: dict, versions: dict[int, int]):
+        def load(messages: list[list[dict]]):
+            return [
+                [discord.Embed.from_dict(data) for data in embeds]
+                for embeds in messages
+            ]
+
+        for guild_id, day, version, messages in state.get("week_agendas", []):
+            if versions.get(guild_id, 0) == version:
+                key = (guild_id, dtdate.fromisoformat(day))
+                self.week_agendas[key] = (version, load(messages))
+        for guild_id, version, day, messages in state.get("week_digests", []):
+            if versions.get(guild_id, 0) == version:
+                self.digests[guild_id] = (
+                    version,
+                    dtdate.fromisoformat(day),
+                    load(messages),
+                )
+
+    # endregion
+
+    async def coalesced(self, key: tuple, factory: Callable[[], Awaitable]):
+        """
+        Result of `factory` shared by concurrent requests with the same `key`,
+        whose first item is the guild id used for the per-guild limit.
+        """
+
+        async def limited():
+            async with self.heavy_limit(key[0]):
+                return await factory()
+
+        return await self.flights.do(key, limited)
+
+    def audit(self, interaction: discord.Interaction, key: str, **kwargs):
+        self.client.audit_log.record(
+            interaction.guild_id,
+            locale_str(key, user=interaction.user.id, **kwargs),
+        )
+
+    # region Search
+    def search_index(self, guild_id: int) -> TrigramIndex:
+        if guild_id not in self.search_indexes:
+            index = TrigramIndex()
+            for event_id, title, message in (
+                Event.select(Event.id, Event.title, Event.message)
+                .where(Event.guild_id == guild_id)
+                .tuples()
+            ):
+                index.add(event_id, event_text(title, message))
+            self.search_indexes[guild_id] = index
+        return self.search_indexes[guild_id]
+
+    def index_event(self, event: Event):
+        # indeks serwera zbuduje się z bazy przy pierwszym wyszukiwaniu
+        if event.guild_id in self.search_indexes:
+            self.search_indexes[event.guild_id].add(
+                event.id, event_text(event.title, event.message)
+            )
+
+    def unindex_event(self, event: Event | RecurringEvent):
+        # reguły cykliczne nie trafiają do indeksu
+        if isinstance(event, Event) and event.guild_id in self.search_indexes:
+            self.search_indexes[event.guild_id].remove(event.id)
+
+    def find_events(self, guild_id: int, query: str) -> list[Event]:
+        """
+        Resolves an edit/remove query: a date, a fragment of title or message,
+        or, when nothing contains it, the most similar titles/messages.
+        """
+        query_date = parse_date(query, datetime.now(guild_timezone(guild_id)).date())
+        if query_date:
+            return list(
+                Event.select().where(
+                    (Event.date == query_date) & (Event.guild_id == guild_id)
+                )
+            )
+
+        events = list(
+            Event.select().where(
+                (
+                    (fn.Lower(Event.title).contains(query.lower()))
+                    | (fn.Lower(Event.message).contains(query.lower()))
+                )
+                & (Event.guild_id == guild_id)
+            )
+        )
+        if events:
+            return events
+
+        ranked = [event_id for event_id, _ in self.search_index(guild_id).search(query)]
+        by_id = {
+            event.id: event
+            for event in Event.select().where(
+                Event.id.in_(ranked) & (Event.guild_id == guild_id)
+            )
+        }
+        return [by_id[event_id] for event_id in ranked if event_id in by_id]
+
+    # endregion
+
+    async def add_conflict_fields(
+        self, embed: discord.Embed, conflicts: list[EventRecord]
+    ):
+        for event in conflicts[:10]:
+            event_type = await self.translate(
+                locale_str(f"calendar_type_{event.event_type}"), discord.Locale.polish
+            )
+            embed.add_field(
+                name=f"⚠️ {event.title}",
+                value=f"{event_timestamp(event)}\n> 📄 {event_type}",
+                inline=False,
+            )
 
     calendar_group = app_commands.Group(
         name=locale_str("calendar_group"),
@@ -59,6 +323,11 @@ class Calendar(commands.Cog):
         description=locale_str("calendar_show_group_description"),
     )
     calendar_group.add_command(show_subgroup)
+    subscription_subgroup = app_commands.Group(
+        name=locale_str("calendar_subscription_group"),
+        description=locale_str("calendar_subscription_group_description"),
+    )
+    calendar_group.add_command(subscription_subgroup)
 
     # region Add Event
     @calendar_group.command(
@@ -73,6 +342,8 @@ class Calendar(commands.Cog):
         date=locale_str("calendar_add_date"),
         time=locale_str("calendar_add_time"),
         location=locale_str("calendar_add_location"),
+        repeat=locale_str("calendar_add_repeat"),
+        until=locale_str("calendar_add_until"),
     )
     @app_commands.describe(
         title=locale_str("calendar_add_title_description"),
@@ -82,6 +353,8 @@ class Calendar(commands.Cog):
         date=locale_str("calendar_add_date_description"),
         time=locale_str("calendar_add_time_description"),
         location=locale_str("calendar_add_location_description"),
+        repeat=locale_str("calendar_add_repeat_description"),
+        until=locale_str("calendar_add_until_description"),
     )
     @app_commands.default_permissions(manage_events=True)
     async def add(
@@ -94,31 +367,33 @@ class Calendar(commands.Cog):
         role: Optional[discord.Role] = None,
         time: Optional[str] = None,
         location: Optional[str] = None,
+        repeat: Optional[REPEAT_TYPES] = None,
+        until: Optional[str] = None,
     ):
-        date = date.replace("-", ".").replace("/", ".")
-        formatted_date = datetime(1970, 1, 1)
-        formatted_time = None
+        tz = guild_timezone(interaction.guild_id)
+        today = datetime.now(tz).date()
+        formatted_date = parse_date(date, today)
+        formatted_time = parse_time(time)
+        formatted_until = parse_date(until, today)
 
         error_desc = None
         try:
-            try:
-                formatted_date = datetime.strptime(date, "%d.%m.%Y")
-                if formatted_date < datetime.now():
-                    raise PastDateError
-                if formatted_date > datetime.now() + timedelta(days=365):
-                    raise FarDateError
-            except ValueError:
+            if formatted_date is None:
                 error_desc = locale_str("calendar_add_failure_invaliddate")
-            except PastDateError:
+            elif formatted_date < today:
                 error_desc = locale_str("calendar_add_failure_pastdate")
-            except FarDateError:
+            elif formatted_date > today + timedelta(days=365):
                 error_desc = locale_str("calendar_add_failure_fardate")
-            try:
-                if time:
-                    formatted_time = datetime.strptime(time, "%H:%M")
-            except ValueError:
-                if not error_desc:
-                    error_desc = locale_str("calendar_add_failure_invalidtime")
+
+            if not error_desc and time and formatted_time is None:
+                error_desc = locale_str("calendar_add_failure_invalidtime")
+
+            if (
+                not error_desc
+                and until
+                and (formatted_until is None or formatted_until < formatted_date)
+            ):
+                error_desc = locale_str("calendar_add_failure_invaliduntil")
 
             if not error_desc and len(title) > 100:
                 error_desc = locale_str("calendar_add_failure_toolongtitle")
@@ -126,9 +401,8 @@ class Calendar(commands.Cog):
             if error_desc:
                 raise ValueError(error_desc)
 
-            created_event: Event = Event.create(
+            event_data = dict(
                 title=title,
-                date=formatted_date,
                 message=message,
                 event_type=event_type.split("_")[-1] if event_type else "other",
                 role_id=role.id if role else None,
@@ -137,20 +411,115 @@ class Calendar(commands.Cog):
                 location=location,
             )
 
-            await interaction.response.send_message(
-                embed=self.embedGenerator.embed(
-                    title=locale_str("calendar_add_success_title"),
-                    description=await self.client.tree.translator.translate(
-                        locale_str(
-                            "calendar_add_success_message",
-                            title=created_event.title,
-                            event_id=str(created_event.id),
-                        )
+            async def create_event(interaction: discord.Interaction):
+                if repeat:
+                    created_event = RecurringEvent.create(
+                        **event_data,
+                        start_date=formatted_date,
+                        until_date=formatted_until,
+                        interval=2 if repeat == "calendar_repeat_biweekly" else 1,
+                    )
+                    created_event_id = created_event.display_id
+                else:
+                    created_event = Event.create(
+                        **event_data,
+                        date=formatted_date,
+                        start_ts=start_timestamp(formatted_date, formatted_time, tz),
+                    )
+                    created_event_id = str(created_event.id)
+                    self.index_event(created_event)
+                self.data_changed(interaction.guild_id)
+                self.audit(
+                    interaction,
+                    "audit_calendar_add",
+                    title=created_event.title,
+                    event_id=created_event_id,
+                    date=formatted_date.strftime("%d.%m.%Y"),
+                )
+
+                await self.client.send_queue.respond(
+                    interaction,
+                    embed=self.embedGenerator.embed(
+                        title=locale_str("calendar_add_success_title"),
+                        description=await self.client.tree.translator.translate(
+                            locale_str(
+                                "calendar_add_success_message",
+                                title=created_event.title,
+                                event_id=created_event_id,
+                            )
+                        ),
+                        color=discord.Color.green(),
                     ),
-                    color=discord.Color.green(),
-                ),
-                ephemeral=True,
+                    ephemeral=True,
+                )
+
+            # kolizje sprawdzane dla pierwszego wystąpienia
+            conflicts = find_conflicts(
+                interaction.guild_id,
+                event_data["role_id"],
+                formatted_date,
+                formatted_time,
+                tz=tz,
+            )
+            if not conflicts:
+                await create_event(interaction)
+                return
+
+            embed = self.embedGenerator.embed(
+                title=locale_str("calendar_conflict_title"),
+                description=locale_str("calendar_conflict_description", title=title),
+                color=discord.Color.orange(),
+            )
+            await self.add_conflict_fields(embed, conflicts)
+
+            view = ExtView(
+                translator=self.client.tree.translator, locale=discord.Locale.polish
+            )
+
+            async def create_anyway(interaction: discord.Interaction):
+                if not interaction.user.guild_permissions.manage_events:
+                    await self.client.send_queue.respond(
+                        interaction,
+                        await self.client.tree.translator.translate(
+                            locale_str("missing_permissions"), discord.Locale.polish
+                        ),
+                        ephemeral=True,
+                    )
+                    return
+                await interaction.message.delete()
+                await create_event(interaction)
+
+            view.add_item(
+                view.new_button(
+                    style=discord.ButtonStyle.green,
+                    label=locale_str("calendar_conflict_confirm"),
+                    custom_id="calendar_add_anyway",
+                    callback=create_anyway,
+                )
+            )
+
+            async def cancel_add(interaction: discord.Interaction):
+                if interaction.user.guild_permissions.manage_events:
+                    await interaction.message.delete()
+                else:
+                    await self.client.send_queue.respond(
+                        interaction,
+                        await self.client.tree.translator.translate(
+                            locale_str("missing_permissions"), discord.Locale.polish
+                        ),
+                        ephemeral=True,
+                    )
+
+            view.add_item(
+                view.new_button(
+                    style=discord.ButtonStyle.danger,
+                    label=locale_str("calendar_edit_cancel"),
+                    custom_id="calendar_add_cancel",
+                    callback=cancel_add,
+                )
             )
+
+            await self.client.send_queue.respond(interaction, embed=embed, view=view)
         except Exception as e:
             embed = self.embedGenerator.embed(
                 title=locale_str("calendar_add_failure_title"),
@@ -168,7 +537,8 @@ class Calendar(commands.Cog):
             )
             print(pretty_traceback(e))
 
-            await interaction.response.send_message(
+            await self.client.send_queue.respond(
+                interaction,
                 embed=embed,
                 ephemeral=True,
             )
@@ -200,6 +570,7 @@ class Calendar(commands.Cog):
         location=locale_str("calendar_add_location_description"),
     )
     @app_commands.default_permissions(manage_events=True)
+    @defer_first()
     async def edit(
         self,
         interaction: discord.Interaction,
@@ -212,24 +583,16 @@ class Calendar(commands.Cog):
         time: Optional[str],
         location: Optional[str],
     ):
-        if date:
-            date = date.replace("-", ".").replace("/", ".")
-
         async def confirm_edit(interaction: discord.Interaction, event: Event = None):
             if not interaction.user.guild_permissions.manage_events:
                 missing_permissions = await self.client.tree.translator.translate(
                     locale_str("missing_permissions"), discord.Locale.polish
                 )
-                if interaction.response.is_done():
-                    await interaction.followup.send(
-                        missing_permissions,
-                        ephemeral=True,
-                    )
-                else:
-                    await interaction.response.send_message(
-                        missing_permissions,
-                        ephemeral=True,
-                    )
+                await self.client.send_queue.respond(
+                    interaction,
+                    missing_permissions,
+                    ephemeral=True,
+                )
                 return
             _event: Event = (
                 Event.get_or_none(
@@ -350,6 +713,19 @@ class Calendar(commands.Cog):
                 color=discord.Color.orange(),
             )
 
+            conflicts = []
+            if role or date or time:
+                tz = guild_timezone(interaction.guild_id)
+                conflicts = find_conflicts(
+                    interaction.guild_id,
+                    role.id if role else _event.role_id,
+                    parse_date(date, datetime.now(tz).date()) or _event.date,
+                    parse_time(time) or _event.time,
+                    exclude_id=_event.id,
+                    tz=tz,
+                )
+                await self.add_conflict_fields(embed, conflicts)
+
             view = ExtView(
                 translator=self.client.tree.translator, locale=discord.Locale.polish
             )
@@ -361,7 +737,11 @@ class Calendar(commands.Cog):
             view.add_item(
                 view.new_button(
                     style=discord.ButtonStyle.green,
-                    label=locale_str("calendar_edit_confirm"),
+                    label=locale_str(
+                        "calendar_conflict_confirm_edit"
+                        if conflicts
+                        else "calendar_edit_confirm"
+                    ),
                     custom_id=f"calendar_edit_event_{_event.id}",
                     callback=confirm,
                 )
@@ -371,11 +751,12 @@ class Calendar(commands.Cog):
                 if interaction.user.guild_permissions.manage_events:
                     await interaction.message.delete()
                 else:
-                    await interaction.followup.send(
+                    await self.client.send_queue.respond(
+                        interaction,
                         await self.client.tree.translator.translate(
                             locale_str("missing_permissions"),
                             discord.Locale.polish,
-                        )
+                        ),
                     )
 
             view.add_item(
@@ -387,7 +768,8 @@ class Calendar(commands.Cog):
                 )
             )
 
-            await interaction.response.send_message(
+            await self.client.send_queue.respond(
+                interaction,
                 embed=embed,
                 view=view,
             )
@@ -401,16 +783,9 @@ class Calendar(commands.Cog):
                 if not event
                 else event
             )
-            new_date = None
-            new_time = None
-            try:
-                new_date = datetime.strptime(date, "%d.%m.%Y")
-            except:
-                new_date = _event.date
-            try:
-                new_time = datetime.strptime(time, "%H:%M")
-            except:
-                new_time = _event.time
+            tz = guild_timezone(interaction.guild_id)
+            new_date = parse_date(date, datetime.now(tz).date()) or _event.date
+            new_time = parse_time(time) or _event.time
             Event.update(
                 title=title if title else _event.title,
                 message=message if message else _event.message,
@@ -421,18 +796,27 @@ class Calendar(commands.Cog):
                 date=new_date,
                 time=new_time,
                 location=location if location else _event.location,
+                start_ts=start_timestamp(new_date, new_time, tz),
             ).where(Event.id == _event.id).execute()
+            _event.title = title if title else _event.title
+            _event.message = message if message else _event.message
+            self.index_event(_event)
+            self.data_changed(interaction.guild_id)
+            self.audit(
+                interaction,
+                "audit_calendar_edit",
+                title=_event.title,
+                event_id=_event.id,
+            )
             embed = self.embedGenerator.embed(
                 title=locale_str("calendar_edit_success_title"),
                 color=discord.Color.green(),
             )
-            if interaction.response.is_done():
-                await interaction.followup.send(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message(
-                    embed=embed,
-                    ephemeral=True,
-                )
+            await self.client.send_queue.respond(
+                interaction,
+                embed=embed,
+                ephemeral=True,
+            )
 
         event: Event = None
         try:
@@ -445,21 +829,7 @@ class Calendar(commands.Cog):
                 except:
                     raise ValueError(locale_str("calendar_failure_invalidid"))
             else:
-                events = None
-                try:
-                    tempDate = datetime.strptime(query, "%d.%m.%Y")
-                    events = Event.select().where(
-                        (Event.date == tempDate)
-                        & (Event.guild_id == interaction.guild_id)
-                    )
-                except:
-                    events = Event.select().where(
-                        (
-                            (fn.Lower(Event.title).contains(query.lower()))
-                            | (fn.Lower(Event.message).contains(query.lower()))
-                        )
-                        & (Event.guild_id == interaction.guild_id)
-                    )
+                events = self.find_events(interaction.guild_id, query)
 
                 if not events:
                     raise ValueError(locale_str("calendar_failure_notfound"))
@@ -481,11 +851,7 @@ class Calendar(commands.Cog):
                     for i, event in enumerate(events, start=1):
                         embed.add_field(
                             name=str(i) + ". " + event.title,
-                            value=(
-                                f" <t:{int(datetime.timestamp(datetime.combine(event.date, event.time)))}:f>\n"
-                                if event.time
-                                else f" <t:{int(datetime.timestamp(datetime.combine(event.date, dttime(hour=0, minute=0))))}:D>\n"
-                            ),
+                            value=f" {event_timestamp(event)}\n",
                         )
                         view.add_item(
                             view.new_button(
@@ -502,7 +868,8 @@ class Calendar(commands.Cog):
                             )
                         )
 
-                    await interaction.response.send_message(
+                    await self.client.send_queue.respond(
+                        interaction,
                         embed=embed,
                         view=view,
                     )
@@ -510,7 +877,8 @@ class Calendar(commands.Cog):
                     return
 
         except ValueError as e:
-            await interaction.response.send_message(
+            await self.client.send_queue.respond(
+                interaction,
                 embed=self.embedGenerator.embed(
                     title=locale_str("calendar_edit_failure_title"),
                     description=e.args[0],
@@ -531,10 +899,12 @@ class Calendar(commands.Cog):
     @app_commands.rename(query=locale_str("calendar_remove_query"))
     @app_commands.describe(query=locale_str("calendar_remove_query_description"))
     @app_commands.default_permissions(manage_events=True)
+    @defer_first()
     async def remove(self, interaction: discord.Interaction, query: str):
         async def remove_event(interaction: discord.Interaction):
             if not interaction.user.guild_permissions.manage_events:
-                await interaction.followup.send(
+                await self.client.send_queue.respond(
+                    interaction,
                     await self.client.tree.translator.translate(
                         locale_str("missing_permissions"), discord.Locale.polish
                     ),
@@ -549,6 +919,14 @@ class Calendar(commands.Cog):
             deleted = 0
             if event and event.guild_id == interaction.guild_id:
                 deleted = event.delete_instance()
+                self.data_changed(interaction.guild_id)
+                self.unindex_event(event)
+                self.audit(
+                    interaction,
+                    "audit_calendar_remove",
+                    title=event.title,
+                    event_id=getattr(event, "display_id", event.id),
+                )
             embed = self.embedGenerator.embed(
                 title=(
                     locale_str("calendar_remove_success_title")
@@ -562,40 +940,32 @@ class Calendar(commands.Cog):
                 ),
                 color=discord.Color.green() if deleted else discord.Color.red(),
             )
-            if interaction.response.is_done():
-                await interaction.followup.send(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message(
-                    embed=embed,
-                    ephemeral=True,
-                )
+            await self.client.send_queue.respond(
+                interaction,
+                embed=embed,
+                ephemeral=True,
+            )
 
-        event: Event = None
+        event: Event | RecurringEvent = None
         try:
-            if query.startswith("##"):
+            if query.upper().startswith("##R"):
                 try:
-                    event = Event.get_or_none(
-                        (Event.id == int(query[2:]))
-                        & (Event.guild_id == interaction.guild_id)
+                    event = RecurringEvent.get_or_none(
+                        (RecurringEvent.id == int(query[3:]))
+                        & (RecurringEvent.guild_id == interaction.guild_id)
                     )
                 except:
                     raise ValueError(locale_str("calendar_failure_invalidid"))
-            else:
-                events = None
+            elif query.startswith("##"):
                 try:
-                    tempDate = datetime.strptime(query, "%d.%m.%Y")
-                    events = Event.select().where(
-                        (Event.date == tempDate)
+                    event = Event.get_or_none(
+                        (Event.id == int(query[2:]))
                         & (Event.guild_id == interaction.guild_id)
                     )
                 except:
-                    events = Event.select().where(
-                        (
-                            (fn.Lower(Event.title).contains(query.lower()))
-                            | (fn.Lower(Event.message).contains(query.lower()))
-                        )
-                        & (Event.guild_id == interaction.guild_id)
-                    )
+                    raise ValueError(locale_str("calendar_failure_invalidid"))
+            else:
+                events = self.find_events(interaction.guild_id, query)
                 # test
                 for event in events:
                     print(event.title)
@@ -622,11 +992,12 @@ class Calendar(commands.Cog):
                         if interaction.user.guild_permissions.manage_events:
                             await interaction.message.delete()
                         else:
-                            await interaction.followup.send(
+                            await self.client.send_queue.respond(
+                                interaction,
                                 await self.client.tree.translator.translate(
                                     locale_str("missing_permissions"),
                                     discord.Locale.polish,
-                                )
+                                ),
                             )
 
                     view.add_item(
@@ -651,7 +1022,8 @@ class Calendar(commands.Cog):
                         fields=[tempField],
                     )
 
-                    await interaction.response.send_message(
+                    await self.client.send_queue.respond(
+                        interaction,
                         embed=embed,
                         view=view,
                     )
@@ -672,11 +1044,7 @@ class Calendar(commands.Cog):
                         print(event.date, event.time)
                         embed.add_field(
                             name=str(i) + ". " + event.title,
-                            value=(
-                                f" <t:{int(datetime.timestamp(datetime.combine(event.date, event.time)))}:f>\n"
-                                if event.time
-                                else f" <t:{int(datetime.timestamp(datetime.combine(event.date, dttime(hour=0, minute=0))))}:D>\n"
-                            ),
+                            value=f" {event_timestamp(event)}\n",
                         )
                         view.add_item(
                             view.new_button(
@@ -693,14 +1061,16 @@ class Calendar(commands.Cog):
                             )
                         )
 
-                    await interaction.response.send_message(
+                    await self.client.send_queue.respond(
+                        interaction,
                         embed=embed,
                         view=view,
                     )
 
                     return
         except ValueError as e:
-            await interaction.response.send_message(
+            await self.client.send_queue.respond(
+                interaction,
                 embed=self.embedGenerator.embed(
                     title=locale_str("calendar_remove_failure_title"),
                     description=e.args[0],
@@ -714,6 +1084,14 @@ class Calendar(commands.Cog):
             deleted = 0
             if event and event.guild_id == interaction.guild_id:
                 deleted = event.delete_instance()
+                self.data_changed(interaction.guild_id)
+                self.unindex_event(event)
+                self.audit(
+                    interaction,
+                    "audit_calendar_remove",
+                    title=event.title,
+                    event_id=getattr(event, "display_id", event.id),
+                )
             embed = self.embedGenerator.embed(
                 title=(
                     locale_str("calendar_remove_success_title")
@@ -727,13 +1105,11 @@ class Calendar(commands.Cog):
                 ),
                 color=discord.Color.green() if deleted else discord.Color.red(),
             )
-            if interaction.response.is_done():
-                await interaction.followup.send(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message(
-                    embed=embed,
-                    ephemeral=True,
-                )
+            await self.client.send_queue.respond(
+                interaction,
+                embed=embed,
+                ephemeral=True,
+            )
         except Exception as e:
             embed = self.embedGenerator.embed(
                 title=locale_str("calendar_remove_failure_title"),
@@ -742,13 +1118,81 @@ class Calendar(commands.Cog):
                 ),
                 color=discord.Color.red(),
             )
-            if interaction.response.is_done():
-                await interaction.followup.send(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message(
-                    embed=embed,
-                    ephemeral=True,
+            await self.client.send_queue.respond(
+                interaction,
+                embed=embed,
+                ephemeral=True,
+            )
+
+    # endregion
+    # region Skip Recurring Event
+    @calendar_group.command(
+        name=locale_str("calendar_skip"),
+        description=locale_str("calendar_skip_description"),
+    )
+    @app_commands.rename(
+        event_id=locale_str("calendar_skip_id"),
+        date=locale_str("calendar_skip_date"),
+    )
+    @app_commands.describe(
+        event_id=locale_str("calendar_skip_id_description"),
+        date=locale_str("calendar_skip_date_description"),
+    )
+    @app_commands.default_permissions(manage_events=True)
+    async def skip(self, interaction: discord.Interaction, event_id: str, date: str):
+        try:
+            try:
+                rule = RecurringEvent.get_or_none(
+                    (RecurringEvent.id == int(event_id.removeprefix("#").upper()[1:]))
+                    & (RecurringEvent.guild_id == interaction.guild_id)
                 )
+            except ValueError:
+                raise ValueError(locale_str("calendar_failure_invalidid"))
+            if not rule:
+                raise ValueError(locale_str("calendar_failure_notfound"))
+            skipped_date = parse_date(
+                date, datetime.now(guild_timezone(interaction.guild_id)).date()
+            )
+            if skipped_date is None:
+                raise ValueError(locale_str("calendar_add_failure_invaliddate"))
+            if next(rule.occurrences(skipped_date, skipped_date), None) is None:
+                raise ValueError(locale_str("calendar_skip_failure_nooccurrence"))
+
+            rule.skip(skipped_date)
+            rule.save()
+            self.data_changed(interaction.guild_id)
+            self.audit(
+                interaction,
+                "audit_calendar_skip",
+                title=rule.title,
+                event_id=rule.display_id,
+                date=skipped_date.strftime("%d.%m.%Y"),
+            )
+        except ValueError as e:
+            await self.client.send_queue.respond(
+                interaction,
+                embed=self.embedGenerator.embed(
+                    title=locale_str("calendar_skip_failure_title"),
+                    description=e.args[0],
+                    color=discord.Color.red(),
+                ),
+                ephemeral=True,
+            )
+            return
+
+        await self.client.send_queue.respond(
+            interaction,
+            embed=self.embedGenerator.embed(
+                title=locale_str("calendar_skip_success_title"),
+                description=locale_str(
+                    "calendar_skip_success_message",
+                    title=rule.title,
+                    date=skipped_date.strftime("%d.%m.%Y"),
+                ),
+                color=discord.Color.green(),
+            ),
+            ephemeral=True,
+        )
 
     # endregion
     # region Show Event from day
@@ -764,79 +1208,174 @@ class Calendar(commands.Cog):
         date=locale_str("calendar_show_day_date_description"),
         two_rows=locale_str("calendar_show_day_tworows_description"),
     )
+    @defer_first()
     async def show_day(
         self,
         interaction: discord.Interaction,
         date: str,
         two_rows: Optional[bool] = False,
     ):
-        date = date.replace("-", ".").replace("/", ".")
-        try:
-            if date in ["dzisiaj", "today"]:
-                date = datetime.now().strftime("%d.%m.%Y")
-            elif date in ["jutro", "tomorrow"]:
-                date = (datetime.now() + timedelta(days=1)).strftime("%d.%m.%Y")
-            elif date in ["pojutrze", "dayaftertomorrow"]:
-                date = (datetime.now() + timedelta(days=2)).strftime("%d.%m.%Y")
-            formatted_date = datetime.strptime(date, "%d.%m.%Y")
-            events = []
-
-            for i, event in enumerate(
-                Event.select()
-                .where(
-                    (Event.date == formatted_date)
-                    & (Event.guild_id == interaction.guild_id)
-                )
-                .order_by(Event.time)
-            ):
-                tempEvent = EventField(
-                    self.client.tree.translator, discord.Locale.polish
+        formatted_date = parse_date(date)
+        if formatted_date is None:
+            await self.client.send_queue.respond(
+                interaction,
+                embed=self.embedGenerator.embed(
+                    title=locale_str("calendar_show_day_failure_title"),
+                    description=locale_str("calendar_show_day_failure_invaliddate"),
+                    color=discord.Color.red(),
+                ),
+                ephemeral=True,
+            )
+            return
+        date = formatted_date.strftime("%d.%m.%Y")
+        events = []
+
+        today = datetime.now(guild_timezone(interaction.guild_id)).date()
+        for i, event in enumerate(
+            events_between(
+                interaction.guild_id,
+                formatted_date,
+                formatted_date,
+                include_archived=formatted_date < today,
+            )
+        ):
+            tempEvent = EventField(self.client.tree.translator, discord.Locale.polish)
+            await tempEvent._init(event)
+            events.append(tempEvent)
+            if two_rows and i % 2 == 0:
+                events.append(
+                    ExtEmbedGenerator.Field(name="\u200b", value="\u200b", inline=False)
                 )
-                await tempEvent._init(event)
-                events.append(tempEvent)
-                if two_rows and i % 2 == 0:
-                    events.append(
-                        ExtEmbedGenerator.Field(
-                            name="\u200b", value="\u200b", inline=False
-                        )
-                    )
 
-            if two_rows and len(events) > 6:
-                for event in events:
-                    event.inline = True
+        if two_rows and len(events) > 6:
+            for event in events:
+                event.inline = True
 
-            if len(events) > 0:
-                embed = self.embedGenerator.embed(
-                    title=await self.client.tree.translator.translate(
-                        locale_str("calendar_show_day_title", date=date)
-                    ),
-                    fields=events,
-                    color=discord.Color.blurple(),
-                    thumbnail=self.client.user.avatar.url,
-                )
-            else:
-                embed = self.embedGenerator.embed(
-                    title=await self.client.tree.translator.translate(
-                        locale_str("calendar_show_day_title", date=date)
-                    ),
-                    description=locale_str("calendar_show_day_noevents"),
-                    color=discord.Color.blurple(),
-                    thumbnail=self.client.user.avatar.url,
-                )
+        embeds = self.embedGenerator.embeds(
+            title=await self.client.tree.translator.translate(
+                locale_str("calendar_show_day_title", date=date)
+            ),
+            description=(
+                locale_str("calendar_show_day_noevents") if not events else ""
+            ),
+            fields=events,
+            color=discord.Color.blurple(),
+            thumbnail=self.client.user.avatar.url,
+        )
 
-            await interaction.response.send_message(
-                embed=embed,
+        for message_embeds in ExtEmbedGenerator.messages(embeds):
+            await self.client.send_queue.respond(
+                interaction,
+                embeds=message_embeds,
                 allowed_mentions=discord.AllowedMentions.none(),
             )
-        except ValueError:
-            await interaction.response.send_message(
+
+    # endregion
+    # region Show month
+    @show_subgroup.command(
+        name=locale_str("calendar_show_month"),
+        description=locale_str("calendar_show_month_description"),
+    )
+    @app_commands.rename(date=locale_str("calendar_show_month_date"))
+    @app_commands.describe(date=locale_str("calendar_show_month_date_description"))
+    @defer_first()
+    async def show_month(
+        self, interaction: discord.Interaction, date: Optional[str] = None
+    ):
+        tz = guild_timezone(interaction.guild_id)
+        today = datetime.now(tz).date()
+        day = parse_date(date, today) if date else today
+        if day is None:
+            await self.client.send_queue.respond(
+                interaction,
                 embed=self.embedGenerator.embed(
-                    title=locale_str("calendar_show_day_failure_title"),
-                    description=locale_str("calendar_show_day_failure_invaliddate"),
+                    title=locale_str("calendar_show_month_failure_title"),
+                    description=locale_str("calendar_show_month_failure_invaliddate"),
                     color=discord.Color.red(),
                 ),
                 ephemeral=True,
             )
+            return
+
+        first = day.replace(day=1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        days: dict[int, list[tuple[str, str, str]]] = {}
+        for event in events_between(
+            interaction.guild_id, first, last, include_archived=first < today, tz=tz
+        ):
+            days.setdefault(event.date.day, []).append(
+                (
+                    event.time.strftime("%H:%M") if event.time else "",
+                    event.title,
+                    event.event_type,
+                )
+            )
+
+        locale = discord.Locale.polish
+        title = await self.translate(
+            locale_str(
+                "calendar_show_month_title",
+                month=await self.translate(
+                    locale_str(f"month_name_{first.month}"), locale
+                ),
+                year=first.year,
+            ),
+            locale,
+        )
+        weekday_names = [
+            (await self.translate(locale_str(f"weekday_{i}"), locale))[:3]
+            for i in range(7)
+        ]
+        type_labels = {
+            event_type: await self.translate(
+                locale_str(f"calendar_type_{event_type}"), locale
+            )
+            for event_type in TYPE_COLORS
+        }
+        render_args = (
+            first.year,
+            first.month,
+            title,
+            weekday_names,
+            type_labels,
+            days,
+            (
+                today.day
+                if (today.year, today.month) == (first.year, first.month)
+                else None
+            ),
+        )
+        # ten sam miesiąc z tymi samymi danymi i językiem daje ten sam obraz
+        key = hashlib.sha256(repr((str(locale), render_args)).encode()).hexdigest()
+
+        embed = self.embedGenerator.embed(title=title, color=discord.Color.blurple())
+        png, url = self.month_images.get(key, (None, None))
+        if png:
+            self.month_images.move_to_end(key)
+        if url and not attachment_expired(url):
+            embed.set_image(url=url)
+            await self.client.send_queue.respond(interaction, embed=embed)
+            return
+
+        await self.client.send_queue.defer(interaction)
+        if png is None:
+            png = await self.coalesced(
+                (interaction.guild_id, "month", key),
+                lambda: asyncio.get_running_loop().run_in_executor(
+                    self.render_pool, render_month, *render_args
+                ),
+            )
+        embed.set_image(url="attachment://month.png")
+        message = await self.client.send_queue.respond(
+            interaction,
+            embed=embed,
+            file=discord.File(BytesIO(png), filename="month.png"),
+        )
+        url = message.embeds[0].image.url if message and message.embeds else None
+        self.month_images[key] = (png, url)
+        self.month_images.move_to_end(key)
+        while len(self.month_images) > MONTH_IMAGE_CACHE_SIZE:
+            self.month_images.popitem(last=False)
 
     # endregion
     # region Show Event by ID
@@ -855,13 +1394,30 @@ class Calendar(commands.Cog):
         interaction: discord.Interaction,
         event_id: str,
     ):
-        event = Event.get_or_none(
-            (Event.id == event_id) & (Event.guild_id == interaction.guild_id)
-        )
-
-        if not event:
-            await interaction.response.send_message(
-                embed=self.embedGenerator.embed(
+        event_id = event_id.removeprefix("#")
+        if event_id.upper().startswith("R"):
+            rule = RecurringEvent.get_or_none(
+                (RecurringEvent.id == event_id[1:])
+                & (RecurringEvent.guild_id == interaction.guild_id)
+            )
+            event = (
+                next(
+                    rule.occurrences(
+                        start=datetime.now(guild_timezone(rule.guild_id)).date()
+                    ),
+                    None,
+                )
+                or rule.occurrence(rule.start_date)
+                if rule
+                else None
+            )
+        else:
+            event = get_event(event_id, interaction.guild_id)
+
+        if not event:
+            await self.client.send_queue.respond(
+                interaction,
+                embed=self.embedGenerator.embed(
                     title=locale_str("calendar_show_byid_failure_title"),
                     description=locale_str("calendar_show_byid_failure_notfound"),
                     color=discord.Color.red(),
@@ -880,7 +1436,8 @@ class Calendar(commands.Cog):
             thumbnail=self.client.user.avatar.url,
         )
 
-        await interaction.response.send_message(
+        await self.client.send_queue.respond(
+            interaction,
             embed=embed,
             allowed_mentions=discord.AllowedMentions.none(),
         )
@@ -899,40 +1456,18 @@ class Calendar(commands.Cog):
         date=locale_str("calendar_show_week_date_description"),
         week=locale_str("calendar_show_week_week_description"),
     )
+    @defer_first()
     async def show_week(
         self,
         interaction: discord.Interaction,
         date: Optional[str] = None,
         week: Optional[int] = None,
     ):
-        start_of_week: datetime = None
         try:
-            if not date and week is None:
-                start_of_week = datetime.combine(
-                    datetime.now().date(), dttime(hour=0, minute=0, second=0)
-                )
-            if date and week:
-                raise InvalidDateError(
-                    locale_str("calendar_show_week_failure_bothdateandweek")
-                )
-            if date and not week:  # wybrano datę
-                try:
-                    start_of_week = datetime.strptime(date, "%d.%m.%Y")
-                except:
-                    raise InvalidDateError(
-                        locale_str("calendar_show_week_failure_invaliddate")
-                    )
-            if not date and week is not None:  # wybrano numer tygodnia
-                try:
-                    start_of_week = datetime.fromisocalendar(
-                        datetime.now().year, week, 1
-                    )
-                except:
-                    raise InvalidDateError(
-                        locale_str("calendar_show_week_failure_invalidweek")
-                    )
+            start_of_week = self.week_start(interaction.guild_id, date, week)
         except InvalidDateError as e:
-            await interaction.response.send_message(
+            await self.client.send_queue.respond(
+                interaction,
                 embed=self.embedGenerator.embed(
                     title=locale_str("calendar_show_week_failure_title"),
                     description=e.args[0],
@@ -941,54 +1476,167 @@ class Calendar(commands.Cog):
                 ephemeral=True,
             )
             return
+        for message_embeds in await self.coalesced(
+            (interaction.guild_id, "week", start_of_week.date()),
+            lambda: self.render_week(interaction.guild_id, start_of_week),
+        ):
+            await self.client.send_queue.respond(
+                interaction,
+                embeds=message_embeds,
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+
+    def week_start(
+        self, guild_id: int, date: Optional[str], week: Optional[int]
+    ) -> datetime:
+        """First day of the week picked by the `date` or `week` option."""
+        if not date and week is None:
+            return datetime.combine(
+                datetime.now(guild_timezone(guild_id)).date(),
+                dttime(hour=0, minute=0, second=0),
+            )
+        if date and week:
+            raise InvalidDateError(
+                locale_str("calendar_show_week_failure_bothdateandweek")
+            )
+        if date:  # wybrano datę
+            start_of_week = parse_date(
+                date, datetime.now(guild_timezone(guild_id)).date()
+            )
+            if start_of_week is None:
+                raise InvalidDateError(
+                    locale_str("calendar_show_week_failure_invaliddate")
+                )
+            return datetime.combine(start_of_week, dttime())
+        try:  # wybrano numer tygodnia
+            return datetime.fromisocalendar(datetime.now().year, week, 1)
+        except:
+            raise InvalidDateError(locale_str("calendar_show_week_failure_invalidweek"))
+
+    async def render_week(
+        self,
+        guild_id: int,
+        start_of_week: datetime,
+        role_ids: Optional[set[int]] = None,
+    ) -> list[list[discord.Embed]]:
+        """
+        Week agenda from `start_of_week`, as embeds grouped into messages.
+        With `role_ids`, only events for these roles or for everyone are shown.
+        """
+        key = (guild_id, start_of_week.date())
+        version = data_version(guild_id)
+        # osobiste agendy zależą od ról użytkownika, więc nie trafiają do cache
+        cached = self.week_agendas.get(key) if role_ids is None else None
+        if cached and cached[0] == version:
+            self.week_agendas.move_to_end(key)
+            return cached[1]
+
         end_of_week = start_of_week + timedelta(days=7)
-        events = (
-            Event.select()
-            .where(
-                (Event.date >= start_of_week)
-                & (Event.date <= end_of_week)
-                & (Event.guild_id == interaction.guild.id)
-            )
-            .order_by(Event.date, Event.time)
+        # zapytanie w wątku, żeby nie blokować pętli (i żeby równoczesne
+        # identyczne żądania mogły poczekać na jedno, zob. `coalesced`)
+        events = await asyncio.to_thread(
+            lambda: list(
+                events_between(
+                    guild_id,
+                    start_of_week.date(),
+                    end_of_week.date(),
+                    role_ids=role_ids,
+                )
+            )
+        )
+        messages = await self.render_agenda(
+            events,
+            locale_str(
+                (
+                    "calendar_show_week_title"
+                    if role_ids is None
+                    else "calendar_show_mine_title"
+                ),
+                date=await datetime_to_words(
+                    self.client.tree.translator,
+                    discord.Locale.polish,
+                    start_of_week,
+                ),
+            ),
+            locale_str(
+                "calendar_show_week_noevents"
+                if role_ids is None
+                else "calendar_show_mine_noevents"
+            ),
         )
+        if role_ids is not None:
+            return messages
+        self.week_agendas[key] = (version, messages)
+        while len(self.week_agendas) > WEEK_AGENDA_CACHE_SIZE:
+            self.week_agendas.popitem(last=False)
+        return messages
+
+    async def render_agenda(
+        self, events: Iterable[EventRecord], title: locale_str, noevents: locale_str
+    ) -> list[list[discord.Embed]]:
+        """Events grouped by day, as embeds grouped into messages."""
         weekDays = []
 
-        for event in events.group_by(Event.date):
+        for day, day_events in groupby(events, key=lambda event: event.date):
             weekDay = DayField(self.client.tree.translator, discord.Locale.polish)
-            await weekDay._init(
-                event.date, events.where(Event.date == event.date), True
-            )
+            await weekDay._init(day, list(day_events), True)
             weekDays.append(weekDay)
 
-        embed = self.embedGenerator.embed(
-            title=await self.client.tree.translator.translate(
-                locale_str(
-                    "calendar_show_week_title",
-                    date=await datetime_to_words(
-                        self.client.tree.translator,
-                        discord.Locale.polish,
-                        start_of_week,
-                    ),
-                )
-            ),
+        embeds = self.embedGenerator.embeds(
+            title=await self.client.tree.translator.translate(title),
+            description=noevents if not weekDays else "",
+            fields=weekDays,
             color=discord.Color.blurple(),
             thumbnail=self.client.user.avatar.url,
         )
+        return ExtEmbedGenerator.messages(embeds)
 
-        if weekDays:
-            for weekday in weekDays:
-                embed.add_field(
-                    name=weekday.name, value=weekday.value, inline=weekday.inline
-                )
-        else:
-            embed.description = await self.client.tree.translator.translate(
-                locale_str("calendar_show_week_noevents"), discord.Locale.polish
+    # endregion
+    # region Show my events from week
+    @show_subgroup.command(
+        name=locale_str("calendar_show_mine"),
+        description=locale_str("calendar_show_mine_description"),
+    )
+    @app_commands.rename(
+        date=locale_str("calendar_show_week_date"),
+        week=locale_str("calendar_show_week_week"),
+    )
+    @app_commands.describe(
+        date=locale_str("calendar_show_week_date_description"),
+        week=locale_str("calendar_show_week_week_description"),
+    )
+    @defer_first(ephemeral=True)
+    async def show_mine(
+        self,
+        interaction: discord.Interaction,
+        date: Optional[str] = None,
+        week: Optional[int] = None,
+    ):
+        try:
+            start_of_week = self.week_start(interaction.guild_id, date, week)
+        except InvalidDateError as e:
+            await self.client.send_queue.respond(
+                interaction,
+                embed=self.embedGenerator.embed(
+                    title=locale_str("calendar_show_week_failure_title"),
+                    description=e.args[0],
+                    color=discord.Color.red(),
+                ),
+                ephemeral=True,
+            )
+            return
+        # @everyone ma id serwera, więc wydarzenia dla niego też się łapią
+        role_ids = {role.id for role in interaction.user.roles}
+        for message_embeds in await self.coalesced(
+            (interaction.guild_id, "week", start_of_week.date(), frozenset(role_ids)),
+            lambda: self.render_week(interaction.guild_id, start_of_week, role_ids),
+        ):
+            await self.client.send_queue.respond(
+                interaction,
+                embeds=message_embeds,
+                allowed_mentions=discord.AllowedMentions.none(),
+                ephemeral=True,
             )
-
-        await interaction.response.send_message(
-            embed=embed,
-            allowed_mentions=discord.AllowedMentions.none(),
-        )
 
     # endregion
     # region Show All Events
@@ -1004,135 +1652,698 @@ class Calendar(commands.Cog):
         include_old=locale_str("calendar_show_all_includeold_description"),
         show_id=locale_str("calendar_show_all_showid_description"),
     )
+    @defer_first()
     async def show_all(
         self,
         interaction: discord.Interaction,
         include_old: Optional[bool] = False,
         show_id: Optional[bool] = False,
     ):
-        events = (
-            Event.select()
-            .where(Event.guild_id == interaction.guild_id)
-            .order_by(Event.date, Event.time)
+        today = datetime.now(guild_timezone(interaction.guild_id)).date()
+        for message_embeds in await self.coalesced(
+            (interaction.guild_id, "all", today, include_old, show_id),
+            lambda: self.render_all(interaction.guild_id, today, include_old, show_id),
+        ):
+            await self.client.send_queue.respond(
+                interaction,
+                embeds=message_embeds,
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+
+    async def render_all(
+        self, guild_id: int, today: dtdate, include_old: bool, show_id: bool
+    ) -> list[list[discord.Embed]]:
+        # wydarzenia można dodawać maks. 365 dni do przodu, co ogranicza też
+        # rozwijanie wydarzeń cyklicznych bez daty końcowej
+        events = await asyncio.to_thread(
+            lambda: list(
+                events_between(
+                    guild_id,
+                    None if include_old else today,
+                    today + timedelta(days=365),
+                    include_archived=include_old,
+                )
+            )
         )
-        if not include_old:
-            events = events.where(Event.date >= datetime.now())
+        days = groupby(events, key=lambda event: event.date)
 
         weekDays = []
 
-        for event in events.group_by(Event.date):
+        for day, day_events in days:
             weekDay = DayField(
                 self.client.tree.translator, discord.Locale.polish, show_id
             )
-            await weekDay._init(
-                event.date, events.where(Event.date == event.date), True
-            )
+            await weekDay._init(day, list(day_events), True)
             weekDays.append(weekDay)
 
-        embed = self.embedGenerator.embed(
+        embeds = self.embedGenerator.embeds(
             title=await self.client.tree.translator.translate(
                 locale_str("calendar_show_all_title")
                 if not include_old
                 else locale_str("calendar_show_all+old_title")
             ),
+            description=(
+                locale_str("calendar_show_all_noevents") if not weekDays else ""
+            ),
+            fields=weekDays,
             color=discord.Color.blurple(),
             thumbnail=self.client.user.avatar.url,
         )
 
-        if weekDays:
-            if len(weekDays) < 24:
-                for weekday in weekDays:
-                    embed.add_field(
-                        name=weekday.name,
-                        value=weekday.value,
-                        inline=weekday.inline,
-                    )
-            else:
-                for i, weekday in enumerate(weekDays, start=1):
-                    if i >= 25:
-                        embed.add_field(
-                            name=locale_str(
-                                "calendar_show_all_more", count=len(weekDays) - 24
-                            )
-                        )
-                        break
-                    else:
-                        embed.add_field(
-                            name=weekday.name,
-                            value=weekday.value,
-                            inline=weekday.inline,
-                        )
-        else:
-            embed.description = await self.client.tree.translator.translate(
-                locale_str("calendar_show_all_noevents"), discord.Locale.polish
-            )
-
-        await interaction.response.send_message(
-            embed=embed,
-            allowed_mentions=discord.AllowedMentions.none(),
-        )
+        return ExtEmbedGenerator.messages(embeds)
 
     # endregion
 
-    # region auto send show_week
-    async def send_show_week(self):
-        for guild in self.client.guilds:
-            guild_config = GuildConfigs.get_or_none(GuildConfigs.guild_id == guild.id)
-            if not guild_config:
-                continue
-            channel = guild.get_channel(guild_config.events_channel_id)
-            if not channel:
-                continue
+    # region Stats
+    def calendar_stats(self, guild_id: int, start: dtdate, weeks: int) -> CalendarStats:
+        key = (guild_id, start, weeks)
+        version = data_version(guild_id)
+        cached = self.stats_cache.get(key)
+        if cached and cached[0] == version:
+            self.stats_cache.move_to_end(key)
+            return cached[1]
+        end = start + timedelta(weeks=weeks, days=-1)
+        stats = CalendarStats(start, weeks, event_counts(guild_id, start, end))
+        self.stats_cache[key] = (version, stats)
+        self.stats_cache.move_to_end(key)
+        while len(self.stats_cache) > STATS_CACHE_SIZE:
+            self.stats_cache.popitem(last=False)
+        return stats
 
-            start_of_week = datetime.now()
-            end_of_week = start_of_week + timedelta(days=7)
-
-            events = (
-                Event.select()
-                .where(
-                    (Event.date >= start_of_week)
-                    & (Event.date <= end_of_week)
-                    & (Event.guild_id == guild.id)
+    @calendar_group.command(
+        name=locale_str("calendar_stats"),
+        description=locale_str("calendar_stats_description"),
+    )
+    @app_commands.rename(
+        date=locale_str("calendar_stats_date"),
+        weeks=locale_str("calendar_stats_weeks"),
+    )
+    @app_commands.describe(
+        date=locale_str("calendar_stats_date_description"),
+        weeks=locale_str("calendar_stats_weeks_description"),
+    )
+    @defer_first()
+    async def stats(
+        self,
+        interaction: discord.Interaction,
+        date: Optional[str] = None,
+        weeks: Optional[app_commands.Range[int, 1, 52]] = 20,
+    ):
+        today = datetime.now(guild_timezone(interaction.guild_id)).date()
+        start = parse_date(date, today) if date else today
+        if start is None:
+            await self.client.send_queue.respond(
+                interaction,
+                embed=self.embedGenerator.embed(
+                    title=locale_str("calendar_stats_failure_title"),
+                    description=locale_str("calendar_stats_failure_invaliddate"),
+                    color=discord.Color.red(),
+                ),
+                ephemeral=True,
+            )
+            return
+        # statystyki zawsze od poniedziałku
+        start -= timedelta(days=start.weekday())
+        stats = self.calendar_stats(interaction.guild_id, start, weeks)
+
+        fields = []
+        if stats.total:
+            week_lines = [
+                f"`{stats.start + timedelta(weeks=week):%d.%m}` "
+                + " ".join(map(str, days))
+                + f" │ **{sum(days)}**"
+                for week, days in enumerate(stats.per_week_day.tolist())
+            ]
+            type_lines = [
+                await self.translate(
+                    locale_str(f"calendar_type_{event_type}"), discord.Locale.polish
                 )
-                .order_by(Event.date, Event.time)
+                + f": {count}"
+                for event_type, count in stats.per_type().items()
+                if count
+            ]
+            busiest_lines = [
+                f"`{week_start:%d.%m}`: {count}"
+                for week_start, count in stats.busiest_weeks()
+            ]
+            everyone = await self.translate(
+                locale_str("calendar_stats_everyone"), discord.Locale.polish
             )
-            weekDays = []
-
-            for event in events.group_by(Event.date):
-                weekDay = DayField(self.client.tree.translator, discord.Locale.polish)
-                await weekDay._init(
-                    event.date, events.where(Event.date == event.date), True
+            role_lines = [
+                await self.translate(
+                    locale_str(
+                        "calendar_stats_role_line",
+                        role=f"<@&{role_id}>" if role_id else everyone,
+                        count=count,
+                        mean=f"{mean:.2f}",
+                        peak=peak,
+                    ),
+                    discord.Locale.polish,
                 )
-                weekDays.append(weekDay)
+                for role_id, count, mean, peak in stats.exam_density()
+            ]
+            for name, lines in (
+                ("calendar_stats_weeks_field", week_lines),
+                ("calendar_stats_types_field", type_lines),
+                ("calendar_stats_busiest_field", busiest_lines),
+                ("calendar_stats_roles_field", role_lines),
+            ):
+                if lines:
+                    fields.append(
+                        ExtEmbedGenerator.Field(
+                            await self.translate(
+                                locale_str(name), discord.Locale.polish
+                            ),
+                            "\n".join(lines),
+                        )
+                    )
 
-            embed = self.embedGenerator.embed(
-                title=await self.client.tree.translator.translate(
+        embeds = self.embedGenerator.embeds(
+            title=await self.translate(
+                locale_str(
+                    "calendar_stats_title",
+                    start=stats.start.strftime("%d.%m.%Y"),
+                    end=stats.end.strftime("%d.%m.%Y"),
+                    total=stats.total,
+                ),
+                discord.Locale.polish,
+            ),
+            description=locale_str("calendar_stats_noevents") if not fields else "",
+            fields=fields,
+            color=discord.Color.blurple(),
+        )
+        for message_embeds in ExtEmbedGenerator.messages(embeds):
+            await self.client.send_queue.respond(
+                interaction,
+                embeds=message_embeds,
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+
+    # endregion
+
+    # region Subscriptions
+    @subscription_subgroup.command(
+        name=locale_str("calendar_subscription_add"),
+        description=locale_str("calendar_subscription_add_description"),
+    )
+    @app_commands.rename(
+        role=locale_str("calendar_subscription_role"),
+        event_type=locale_str("calendar_subscription_eventtype"),
+    )
+    @app_commands.describe(
+        role=locale_str("calendar_subscription_role_description"),
+        event_type=locale_str("calendar_subscription_eventtype_description"),
+    )
+    async def subscription_add(
+        self,
+        interaction: discord.Interaction,
+        role: Optional[discord.Role] = None,
+        event_type: Optional[EVENT_TYPES] = None,
+    ):
+        role_id = role.id if role else None
+        event_type = event_type.split("_")[-1] if event_type else None
+        created = subscribe(
+            interaction.guild_id, interaction.user.id, role_id, event_type
+        )
+        await self.client.send_queue.respond(
+            interaction,
+            embed=self.embedGenerator.embed(
+                title=locale_str(
+                    "calendar_subscription_add_success_title"
+                    if created
+                    else "calendar_subscription_add_exists_title"
+                ),
+                description=await self.client.tree.translator.translate(
                     locale_str(
-                        "calendar_show_week_title",
-                        date=await datetime_to_words(
-                            self.client.tree.translator,
-                            discord.Locale.polish,
-                            start_of_week,
+                        "calendar_subscription_add_success_description",
+                        subscription=await self.describe_subscription(
+                            role_id, event_type
                         ),
                     )
                 ),
+                color=discord.Color.green() if created else discord.Color.orange(),
+            ),
+            ephemeral=True,
+        )
+
+    @subscription_subgroup.command(
+        name=locale_str("calendar_subscription_remove"),
+        description=locale_str("calendar_subscription_remove_description"),
+    )
+    @app_commands.rename(
+        role=locale_str("calendar_subscription_role"),
+        event_type=locale_str("calendar_subscription_eventtype"),
+    )
+    @app_commands.describe(
+        role=locale_str("calendar_subscription_role_description"),
+        event_type=locale_str("calendar_subscription_eventtype_description"),
+    )
+    async def subscription_remove(
+        self,
+        interaction: discord.Interaction,
+        role: Optional[discord.Role] = None,
+        event_type: Optional[EVENT_TYPES] = None,
+    ):
+        # bez opcji usuwa wszystkie subskrypcje użytkownika na serwerze
+        removed = unsubscribe(
+            interaction.guild_id,
+            interaction.user.id,
+            role.id if role else None,
+            event_type.split("_")[-1] if event_type else None,
+            everything=role is None and event_type is None,
+        )
+        await self.client.send_queue.respond(
+            interaction,
+            embed=self.embedGenerator.embed(
+                title=locale_str(
+                    "calendar_subscription_remove_success_title"
+                    if removed
+                    else "calendar_subscription_remove_notfound_title"
+                ),
+                description=(
+                    locale_str(
+                        "calendar_subscription_remove_success_description",
+                        count=removed,
+                    )
+                    if removed
+                    else locale_str("calendar_subscription_remove_notfound")
+                ),
+                color=discord.Color.green() if removed else discord.Color.orange(),
+            ),
+            ephemeral=True,
+        )
+
+    @subscription_subgroup.command(
+        name=locale_str("calendar_subscription_list"),
+        description=locale_str("calendar_subscription_list_description"),
+    )
+    async def subscription_list(self, interaction: discord.Interaction):
+        lines = [
+            "• "
+            + await self.describe_subscription(
+                subscription.role_id, subscription.event_type
+            )
+            for subscription in user_subscriptions(
+                interaction.guild_id, interaction.user.id
+            )
+        ]
+        await self.client.send_queue.respond(
+            interaction,
+            embed=self.embedGenerator.embed(
+                title=locale_str("calendar_subscription_list_title"),
+                description=(
+                    "\n".join(lines)
+                    if lines
+                    else locale_str("calendar_subscription_list_empty")
+                ),
                 color=discord.Color.blurple(),
-                thumbnail=self.client.user.avatar.url,
+            ),
+            ephemeral=True,
+        )
+
+    async def describe_subscription(
+        self, role_id: Optional[int], event_type: Optional[str]
+    ) -> str:
+        translate = self.client.tree.translator.translate
+        role = (
+            f"<@&{role_id}>"
+            if role_id
+            else await translate(locale_str("calendar_subscription_allroles"))
+        )
+        event_type = await translate(
+            locale_str(
+                f"calendar_type_{event_type}"
+                if event_type
+                else "calendar_subscription_alltypes"
+            )
+        )
+        return f"{role}, {event_type}"
+
+    async def send_to_subscribers(
+        self,
+        guild: discord.Guild,
+        events: list[EventRecord],
+        title: locale_str,
+        priority: Priority,
+    ):
+        """
+        Sends each subscriber the `events` matching their subscriptions in DMs.
+        Subscribers with the same filters are matched once and every distinct
+        list of events is rendered once, however many users receive it.
+        """
+        by_filters: defaultdict[frozenset, list[int]] = defaultdict(list)
+        for user_id, filters in subscribers(guild.id).items():
+            by_filters[filters].append(user_id)
+        by_content: defaultdict[tuple[int, ...], list[int]] = defaultdict(list)
+        for filters, user_ids in by_filters.items():
+            content = tuple(
+                i
+                for i, event in enumerate(events)
+                if subscription_matches(filters, event)
+            )
+            if content:
+                by_content[content].extend(user_ids)
+        if not by_content:
+            return
+
+        semaphore = asyncio.Semaphore(self.bot_config.get("dm_concurrency", 10))
+        delivered: list[int] = []
+        rejected: list[int] = []
+
+        async def deliver(user_id: int, messages: list[list[discord.Embed]]):
+            async with semaphore:
+                try:
+                    user = self.client.get_user(
+                        user_id
+                    ) or await self.client.fetch_user(user_id)
+                    for message_embeds in messages:
+                        await self.client.send_queue.send_to(
+                            user, embeds=message_embeds, priority=priority
+                        )
+                except (discord.Forbidden, discord.NotFound):
+                    # zamknięte wiadomości prywatne albo usunięte konto
+                    rejected.append(user_id)
+                except discord.HTTPException as e:
+                    print(pretty_traceback(e))
+                else:
+                    delivered.append(user_id)
+
+        deliveries = []
+        for content, user_ids in by_content.items():
+            messages = await self.render_agenda(
+                [events[i] for i in content],
+                title,
+                locale_str("calendar_show_week_noevents"),
+            )
+            deliveries.extend(deliver(user_id, messages) for user_id in user_ids)
+        await asyncio.gather(*deliveries)
+
+        unsubscribed = record_deliveries(guild.id, delivered, rejected)
+        if unsubscribed:
+            self.client.audit_log.record(
+                guild.id,
+                locale_str("audit_subscription_unsubscribed", count=len(unsubscribed)),
+            )
+
+    async def send_reminders(self, guild: discord.Guild):
+        """DMs subscribers the events of the next day."""
+        tomorrow = datetime.now(guild_timezone(guild.id)).date() + timedelta(days=1)
+        events = list(events_between(guild.id, tomorrow, tomorrow))
+        if not events:
+            return
+        await self.send_to_subscribers(
+            guild,
+            events,
+            locale_str(
+                "calendar_subscription_reminder_title",
+                guild=guild.name,
+                date=await datetime_to_words(
+                    self.client.tree.translator, discord.Locale.polish, tomorrow
+                ),
+            ),
+            Priority.REMINDER,
+        )
+
+    # endregion
+
+    # region Live agenda
+    def data_changed(self, guild_id: int):
+        """Call after every change of the guild's events."""
+        bump_data_version(guild_id)
+        self.schedule_agenda_update(guild_id)
+
+    def schedule_agenda_update(self, guild_id: int):
+        """
+        Refreshes the pinned agenda `agenda_debounce` seconds after the last
+        change, but no later than `agenda_max_delay` after the first one, so a
+        burst of changes ends in a single edit.
+        """
+        now = time.monotonic()
+        self.agenda_due[guild_id] = now + self.bot_config.get("agenda_debounce", 10)
+        if guild_id not in self.agenda_timers:
+            self.agenda_timers[guild_id] = asyncio.create_task(
+                self._update_agenda_later(
+                    guild_id, now + self.bot_config.get("agenda_max_delay", 60)
+                )
+            )
+
+    async def _update_agenda_later(self, guild_id: int, deadline: float):
+        try:
+            while (due := min(self.agenda_due[guild_id], deadline)) > time.monotonic():
+                await asyncio.sleep(due - time.monotonic())
+        finally:
+            self.agenda_timers.pop(guild_id, None)
+            self.agenda_due.pop(guild_id, None)
+        await self.update_agenda(guild_id)
+
+    async def render_agenda_message(
+        self, guild_id: int
+    ) -> tuple[list[discord.Embed], str]:
+        """Embeds of the pinned agenda (7 days from today) and their hash."""
+        today = datetime.now(guild_timezone(guild_id)).date()
+        self.agenda_dates[guild_id] = today
+        messages = await self.render_week(guild_id, datetime.combine(today, dttime()))
+        # agenda to jedna wiadomość, dalsze części tygodnia się nie mieszczą
+        embeds = messages[0]
+        content = json.dumps([embed.to_dict() for embed in embeds], sort_keys=True)
+        return embeds, hashlib.sha256(content.encode()).hexdigest()
+
+    async def update_agenda(self, guild_id: int):
+        """Edits the pinned agenda, only if its rendered content changed."""
+        async with self.agenda_locks[guild_id]:
+            guild_config = GuildConfigs.get_or_none(GuildConfigs.guild_id == guild_id)
+            if not guild_config or not guild_config.agenda_message_id:
+                return
+            channel = self.client.get_channel(guild_config.agenda_channel_id)
+            if channel is None:
+                return
+            embeds, content_hash = await self.render_agenda_message(guild_id)
+            if content_hash == guild_config.agenda_hash:
+                return
+            message = channel.get_partial_message(guild_config.agenda_message_id)
+            try:
+                await self.client.send_queue.send(
+                    lambda: message.edit(
+                        embeds=embeds,
+                        allowed_mentions=discord.AllowedMentions.none(),
+                    ),
+                    priority=Priority.DIGEST,
+                    route=f"channel:{channel.id}",
+                )
+            except discord.NotFound:
+                # ktoś usunął wiadomość, agenda wyłącza się do ponownego ustawienia
+                GuildConfigs.update(
+                    agenda_channel_id=None, agenda_message_id=None, agenda_hash=None
+                ).where(GuildConfigs.guild_id == guild_id).execute()
+                self.client.audit_log.record(
+                    guild_id, locale_str("audit_agenda_missing", channel=channel.id)
+                )
+                return
+            except discord.HTTPException as e:
+                print(pretty_traceback(e))
+                return
+            GuildConfigs.update(agenda_hash=content_hash).where(
+                GuildConfigs.guild_id == guild_id
+            ).execute()
+
+    async def roll_over_agendas(self):
+        """Moves agendas to the next day after midnight in the guild timezone."""
+        for (guild_id,) in (
+            GuildConfigs.select(GuildConfigs.guild_id)
+            .where(GuildConfigs.agenda_message_id.is_null(False))
+            .tuples()
+        ):
+            # serwery innych procesów (shardów) odświeża ich własny proces
+            if self.client.get_guild(guild_id) is None:
+                continue
+            if (
+                self.agenda_dates.get(guild_id)
+                != datetime.now(guild_timezone(guild_id)).date()
+            ):
+                await self.update_agenda(guild_id)
+
+    async def start_live_agenda(
+        self, guild_id: int, channel: discord.TextChannel
+    ) -> discord.Message:
+        """Posts and pins the agenda in `channel`, replacing the previous one."""
+        await self.stop_live_agenda(guild_id)
+        async with self.agenda_locks[guild_id]:
+            embeds, content_hash = await self.render_agenda_message(guild_id)
+            message = await self.client.send_queue.send_to(
+                channel,
+                embeds=embeds,
+                allowed_mentions=discord.AllowedMentions.none(),
+                priority=Priority.INTERACTION,
             )
+            try:
+                await message.pin()
+            except discord.HTTPException:
+                # bez uprawnienia do przypinania agenda działa, tylko nie jest przypięta
+                pass
+            GuildConfigs.update(
+                agenda_channel_id=channel.id,
+                agenda_message_id=message.id,
+                agenda_hash=content_hash,
+            ).where(GuildConfigs.guild_id == guild_id).execute()
+        return message
+
+    async def stop_live_agenda(self, guild_id: int):
+        async with self.agenda_locks[guild_id]:
+            guild_config = GuildConfigs.get_or_none(GuildConfigs.guild_id == guild_id)
+            if not guild_config or not guild_config.agenda_message_id:
+                return
+            GuildConfigs.update(
+                agenda_channel_id=None, agenda_message_id=None, agenda_hash=None
+            ).where(GuildConfigs.guild_id == guild_id).execute()
+            channel = self.client.get_channel(guild_config.agenda_channel_id)
+            if channel is None:
+                return
+            try:
+                await channel.get_partial_message(
+                    guild_config.agenda_message_id
+                ).delete()
+            except discord.HTTPException:
+                pass
 
-            if weekDays:
-                for weekday in weekDays:
-                    embed.add_field(
-                        name=weekday.name, value=weekday.value, inline=weekday.inline
+    # endregion
+
+    # region auto send show_week
+    async def render_week_digest(
+        self, guild: discord.Guild, day: dtdate
+    ) -> list[list[discord.Embed]]:
+        return await self.render_week(guild.id, datetime.combine(day, dttime()))
+
+    def schedule_digests(self, guild_ids: list[int]):
+        """
+        (Re)schedules the week digests of the guilds from their `digest_day`,
+        `digest_hour` and timezone, and the daily subscriber reminders at
+        `reminder_hour` local time. Call again after the configuration changes.
+        """
+        window = self.bot_config.get("digest_precompute_window", 3000)
+        for offset in range(0, len(guild_ids), 500):
+            for guild_config in GuildConfigs.select().where(
+                GuildConfigs.guild_id.in_(guild_ids[offset : offset + 500])
+            ):
+                guild_id = guild_config.guild_id
+                tz = guild_timezone(guild_id)
+                self.schedule_reminder(guild_id, tz)
+                send_at = next_weekly(
+                    guild_config.digest_day, guild_config.digest_hour, tz
+                ).timestamp()
+                self.digest_timers.schedule(("send", guild_id), send_at)
+                # podsumowania są przygotowywane w godzinie przed wysłaniem,
+                # rozłożone na `digest_precompute_window` sekund według czasu
+                # utworzenia serwera, żeby nie trafiały do bazy naraz
+                spread = ((guild_id >> 22) % 1000) / 1000
+                self.digest_timers.schedule(
+                    ("precompute", guild_id), send_at - 3600 + window * spread
+                )
+
+    def schedule_reminder(self, guild_id: int, tz: Optional[ZoneInfo] = None):
+        self.digest_timers.schedule(
+            ("remind", guild_id),
+            next_daily(
+                self.bot_config.get("reminder_hour", 18),
+                tz or guild_timezone(guild_id),
+            ).timestamp(),
+        )
+
+    async def fire_digest(self, key: tuple[str, int]):
+        kind, guild_id = key
+        guild = self.client.get_guild(guild_id)
+        if guild is None:
+            return
+        if kind == "precompute":
+            send_at = self.digest_timers.when(("send", guild_id))
+            if send_at is None:
+                return
+            # tydzień od dnia wysłania, bo przygotowanie może wypaść dzień wcześniej
+            day = datetime.fromtimestamp(send_at, guild_timezone(guild_id)).date()
+            version = data_version(guild_id)
+            self.digests[guild_id] = (
+                version,
+                day,
+                await self.render_week_digest(guild, day),
+            )
+            return
+        if kind == "remind":
+            try:
+                await self.send_reminders(guild)
+            finally:
+                self.schedule_reminder(guild_id)
+            return
+        try:
+            await self.send_show_week(guild)
+        finally:
+            self.schedule_digests([guild_id])
+
+    async def send_show_week(self, guild: discord.Guild):
+        start = datetime.now(guild_timezone(guild.id))
+        version, day, messages = self.digests.pop(guild.id, (None, None, None))
+        guild_config = GuildConfigs.get_or_none(GuildConfigs.guild_id == guild.id)
+        channel = (
+            guild.get_channel(guild_config.events_channel_id) if guild_config else None
+        )
+        if channel:
+            # wydarzenia zmieniły się po przygotowaniu podsumowania albo
+            # wysyłka opóźniła się na kolejny dzień
+            if (
+                messages is None
+                or version != data_version(guild.id)
+                or day != start.date()
+            ):
+                messages = await self.render_week_digest(guild, start.date())
+            try:
+                for message_embeds in messages:
+                    await self.client.send_queue.send_to(
+                        channel,
+                        embeds=message_embeds,
+                        allowed_mentions=discord.AllowedMentions.all(),
+                        priority=Priority.DIGEST,
                     )
+            except discord.HTTPException as e:
+                self.client.audit_log.record(
+                    guild.id,
+                    locale_str("audit_digest_failure", channel=channel.id, error=e),
+                )
             else:
-                embed.description = await self.client.tree.translator.translate(
-                    locale_str("calendar_show_week_noevents"), discord.Locale.polish
+                self.client.audit_log.record(
+                    guild.id, locale_str("audit_digest_success", channel=channel.id)
                 )
 
-            await channel.send(
-                embed=embed, allowed_mentions=discord.AllowedMentions.all()
-            )
+        events = list(
+            events_between(guild.id, start.date(), (start + timedelta(days=7)).date())
+        )
+        if not events:
+            return
+        await self.send_to_subscribers(
+            guild,
+            events,
+            locale_str(
+                "calendar_subscription_digest_title",
+                guild=guild.name,
+                date=await datetime_to_words(
+                    self.client.tree.translator, discord.Locale.polish, start
+                ),
+            ),
+            Priority.DIGEST,
+        )
+
+    # endregion
+
+    # region auto archive old events
+    async def archive_old_events(self):
+        # przy kilku procesach archiwizuje tylko lider
+        if not self.client.leader.try_acquire():
+            return
+        before = datetime.now().date() - timedelta(
+            days=self.bot_config.get("archive_after_days", 30)
+        )
+        # partiami, żeby nie blokować pętli zdarzeń na dłużej niż jedną transakcję
+        while archive_events(before, self.bot_config.get("archive_batch_size", 500)):
+            # zarchiwizowane wydarzenia nie są już wyszukiwane
+            self.search_indexes.clear()
+            await asyncio.sleep(0)
 
     # endregion
 
@@ -1141,6 +2352,13 @@ async def setup(client: commands.Bot):
     await client.add_cog(Calendar(client))
 
 
+def event_timestamp(event: Event | EventRecord) -> str:
+    if event.time:
+        return f"<t:{event.start_ts}:f>"
+    # południe zamiast północy, żeby data nie przesunęła się w innych strefach
+    return f"<t:{event.start_ts + 12 * 60 * 60}:D>"
+
+
 class EventField(ExtEmbedGenerator.Field):
     def __init__(
         self,
@@ -1150,14 +2368,10 @@ class EventField(ExtEmbedGenerator.Field):
         self.translator = translator
         self.locale = locale
 
-    async def _init(self, event: Event):
+    async def _init(self, event: Event | EventRecord):
         self.field_title = f"◻️{event.title}"
         self.field_desc = ""
-        self.field_desc += (
-            f" <t:{int(datetime.timestamp(datetime.combine(event.date, event.time)))}:f>\n"
-            if event.time
-            else f" <t:{int(datetime.timestamp(datetime.combine(event.date, dttime(hour=12))))}:D>\n"
-        )
+        self.field_desc += f" {event_timestamp(event)}\n"
         self.field_desc += (
             "> 📄 "
             + await self.translator.translate(
@@ -1196,7 +2410,7 @@ class DayField(ExtEmbedGenerator.Field):
         self.show_id = show_id
 
     async def _init(
-        self, date: datetime, events: list[Event], inline: Optional[bool] = False
+        self, date: datetime, events: list[EventRecord], inline: Optional[bool] = False
     ):
         self.name = (
             await datetime_to_words(
@@ -1213,7 +2427,7 @@ class DayField(ExtEmbedGenerator.Field):
         self.value = "\n".join(
             [
                 (
-                    f"•`#{event.id}`  {event.title} o <t:{int(datetime.timestamp(datetime.combine(event.date, event.time)))}:t>"
+                    f"•`#{event.id}`  {event.title} o <t:{event.start_ts}:t>"
                     if event.time
                     else f"•`#{event.id}`  {event.title}"
                 )
@@ -1222,7 +2436,7 @@ class DayField(ExtEmbedGenerator.Field):
             if self.show_id
             else [
                 (
-                    f"• {event.title} o <t:{int(datetime.timestamp(datetime.combine(event.date, event.time)))}:t>"
+                    f"• {event.title} o <t:{event.start_ts}:t>"
                     if event.time
                     else f"• {event.title}"
                 )
@@ -1,4 +1,6 @@
-from typing import Optional
+import asyncio
+from typing import Literal, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 # discord import
 import discord
@@ -7,7 +9,36 @@ from discord.ext import commands
 from discord.app_commands import locale_str
 
 from utils.discord_extension import ExtEmbedGenerator
-from orms.configs import GuildConfigs
+from orms.calendar import (
+    Event,
+    ArchivedEvent,
+    bump_data_version,
+    database,
+    update_start_ts,
+)
+from orms.configs import GuildConfigs, forget_guild_timezone
+
+WEEKDAYS = Literal[
+    "weekday_0",
+    "weekday_1",
+    "weekday_2",
+    "weekday_3",
+    "weekday_4",
+    "weekday_5",
+    "weekday_6",
+]
+
+
+def change_timezone(guild_id: int, timezone: str) -> None:
+    """Saves the guild timezone and recomputes `start_ts` of its events."""
+    GuildConfigs.update(timezone=timezone).where(
+        GuildConfigs.guild_id == guild_id
+    ).execute()
+    forget_guild_timezone(guild_id)
+    with database.atomic("IMMEDIATE"):
+        for model in (Event, ArchivedEvent):
+            update_start_ts(model, guild_id=guild_id)
+        bump_data_version(guild_id)
 
 
 class Config(commands.Cog):
@@ -22,18 +53,40 @@ class Config(commands.Cog):
     @app_commands.rename(
         events_channel=locale_str("config_events_channel"),
         logging_channel=locale_str("config_logging_channel"),
+        timezone=locale_str("config_timezone"),
+        agenda=locale_str("config_agenda"),
+        digest_day=locale_str("config_digest_day"),
+        digest_hour=locale_str("config_digest_hour"),
     )
     @app_commands.describe(
         events_channel=locale_str("config_events_channel_description"),
         logging_channel=locale_str("config_logging_channel_description"),
+        timezone=locale_str("config_timezone_description"),
+        agenda=locale_str("config_agenda_description"),
+        digest_day=locale_str("config_digest_day_description"),
+        digest_hour=locale_str("config_digest_hour_description"),
     )
     async def config(
         self,
         interaction: discord.Interaction,
         events_channel: Optional[discord.TextChannel] = None,
         logging_channel: Optional[discord.TextChannel] = None,
+        timezone: Optional[str] = None,
+        agenda: Optional[bool] = None,
+        digest_day: Optional[WEEKDAYS] = None,
+        digest_hour: Optional[app_commands.Range[int, 0, 23]] = None,
     ):
-        if all(x is None for x in [events_channel, logging_channel]):
+        if all(
+            x is None
+            for x in [
+                events_channel,
+                logging_channel,
+                timezone,
+                agenda,
+                digest_day,
+                digest_hour,
+            ]
+        ):
             guild_config = GuildConfigs.get(interaction.guild_id)
             embed = self.embedGenerator.embed(
                 title=locale_str("config_embed_title"),
@@ -54,6 +107,32 @@ class Config(commands.Cog):
                             else await self.translate(locale_str("none"))
                         ),
                     ),
+                    ExtEmbedGenerator.Field(
+                        name=locale_str("config_timezone"),
+                        value=guild_config.timezone,
+                    ),
+                    ExtEmbedGenerator.Field(
+                        name=locale_str("config_agenda"),
+                        value=(
+                            f"https://discord.com/channels/{interaction.guild_id}"
+                            f"/{guild_config.agenda_channel_id}"
+                            f"/{guild_config.agenda_message_id}"
+                            if guild_config.agenda_message_id
+                            else await self.translate(locale_str("none"))
+                        ),
+                    ),
+                    ExtEmbedGenerator.Field(
+                        name=locale_str("config_digest"),
+                        value=await self.translate(
+                            locale_str(
+                                "config_digest_value",
+                                weekday=await self.translate(
+                                    locale_str(f"weekday_{guild_config.digest_day}")
+                                ),
+                                hour=guild_config.digest_hour,
+                            )
+                        ),
+                    ),
                 ],
                 thumbnail=(
                     interaction.guild.icon.url
@@ -62,7 +141,7 @@ class Config(commands.Cog):
                 ),
                 color=discord.Color.dark_blue(),
             )
-            await interaction.response.send_message(embed=embed)
+            await self.client.send_queue.respond(interaction, embed=embed)
             return
         if events_channel is not None:
             embed = self.embedGenerator.embed(
@@ -85,10 +164,9 @@ class Config(commands.Cog):
                     color=discord.Color.red(),
                 )
 
-            if interaction.response.is_done():
-                await interaction.followup.send(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message(embed=embed, ephemeral=True)
+            await self.client.send_queue.respond(
+                interaction, embed=embed, ephemeral=True
+            )
         if logging_channel is not None:
             embed = self.embedGenerator.embed(
                 title=locale_str(
@@ -97,7 +175,7 @@ class Config(commands.Cog):
                 color=discord.Color.green(),
             )
             if discord.Permissions(permissions=2048).is_subset(
-                events_channel.permissions_for(interaction.guild.me)
+                logging_channel.permissions_for(interaction.guild.me)
             ):
                 GuildConfigs.update(logging_channel_id=logging_channel.id).where(
                     GuildConfigs.guild_id == interaction.guild_id
@@ -110,10 +188,107 @@ class Config(commands.Cog):
                     color=discord.Color.red(),
                 )
 
-            if interaction.response.is_done():
-                await interaction.followup.send(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message(embed=embed, ephemeral=True)
+            await self.client.send_queue.respond(
+                interaction, embed=embed, ephemeral=True
+            )
+
+        if timezone is not None:
+            try:
+                ZoneInfo(timezone)
+                # przeliczenie wszystkich wydarzeń serwera trwa, więc najpierw
+                # odroczenie, a zapis w wątku poza pętlą
+                await self.client.send_queue.defer(interaction, ephemeral=True)
+                await asyncio.to_thread(change_timezone, interaction.guild_id, timezone)
+                calendar = self.client.get_cog("Calendar")
+                if calendar:
+                    calendar.schedule_agenda_update(interaction.guild_id)
+                    calendar.schedule_digests([interaction.guild_id])
+                embed = self.embedGenerator.embed(
+                    title=locale_str("config_timezone_success", timezone=timezone),
+                    color=discord.Color.green(),
+                )
+            except (ZoneInfoNotFoundError, ValueError):
+                embed = self.embedGenerator.embed(
+                    title=locale_str("config_timezone_fail", timezone=timezone),
+                    color=discord.Color.red(),
+                )
+
+            await self.client.send_queue.respond(
+                interaction, embed=embed, ephemeral=True
+            )
+
+        if agenda is not None:
+            embed = await self.set_agenda(interaction, agenda)
+            await self.client.send_queue.respond(
+                interaction, embed=embed, ephemeral=True
+            )
+
+        if digest_day is not None or digest_hour is not None:
+            embed = await self.set_digest(interaction, digest_day, digest_hour)
+            await self.client.send_queue.respond(
+                interaction, embed=embed, ephemeral=True
+            )
+
+    async def set_digest(
+        self,
+        interaction: discord.Interaction,
+        digest_day: Optional[str],
+        digest_hour: Optional[int],
+    ) -> discord.Embed:
+        changes = {}
+        if digest_day is not None:
+            changes["digest_day"] = int(digest_day.split("_")[-1])
+        if digest_hour is not None:
+            changes["digest_hour"] = digest_hour
+        GuildConfigs.update(**changes).where(
+            GuildConfigs.guild_id == interaction.guild_id
+        ).execute()
+        calendar = self.client.get_cog("Calendar")
+        if calendar:
+            calendar.schedule_digests([interaction.guild_id])
+
+        guild_config = GuildConfigs.get(interaction.guild_id)
+        return self.embedGenerator.embed(
+            title=locale_str(
+                "config_digest_success",
+                weekday=await self.translate(
+                    locale_str(f"weekday_{guild_config.digest_day}")
+                ),
+                hour=guild_config.digest_hour,
+            ),
+            color=discord.Color.green(),
+        )
+
+    async def set_agenda(
+        self, interaction: discord.Interaction, enabled: bool
+    ) -> discord.Embed:
+        calendar = self.client.get_cog("Calendar")
+        if not enabled:
+            await calendar.stop_live_agenda(interaction.guild_id)
+            return self.embedGenerator.embed(
+                title=locale_str("config_agenda_disabled"),
+                color=discord.Color.green(),
+            )
+
+        guild_config = GuildConfigs.get(interaction.guild_id)
+        channel = interaction.guild.get_channel(guild_config.events_channel_id or 0)
+        if channel is None:
+            return self.embedGenerator.embed(
+                title=locale_str("config_agenda_fail_nochannel"),
+                color=discord.Color.red(),
+            )
+        try:
+            message = await calendar.start_live_agenda(interaction.guild_id, channel)
+        except discord.HTTPException:
+            return self.embedGenerator.embed(
+                title=locale_str("config_agenda_fail", channel_name=channel.id),
+                color=discord.Color.red(),
+            )
+        return self.embedGenerator.embed(
+            title=locale_str("config_agenda_success"),
+            description=message.jump_url,
+            color=discord.Color.green(),
+        )
 
 
 async def setup(client: commands.Bot):
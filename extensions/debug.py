@@ -27,8 +27,9 @@ class Debug(commands.Cog):
         return ctx.author.id == PRZEMEKKK
 
     async def send_priv(self, ctx: commands.Context, msg: str):
-        await ctx.author.send(
-            f"Command **{ctx.message.content}** executed on **{ctx.guild.name}** with output:\n{msg}"
+        self.client.send_queue.send_log(
+            ctx.author,
+            f"Command **{ctx.message.content}** executed on **{ctx.guild.name}** with output:\n{msg}",
         )
 
     # region Commands
@@ -79,6 +80,51 @@ class Debug(commands.Cog):
         await message.delete()
         await self.send_priv(ctx, f"Deleted message with id {id}")
 
+    @commands.command()
+    async def loop_lag(self, ctx: commands.Context, reset: Optional[str]):
+        monitor = self.client.loop_monitor
+        if reset == "reset":
+            monitor.reset()
+            await self.send_priv(ctx, "Loop monitor reset")
+            return
+        p50, p90, p99, worst = monitor.percentiles(0.5, 0.9, 0.99, 1.0)
+        msg = (
+            f"Loop lag over {len(monitor.lags)} beats: "
+            f"p50 {p50 * 1000:.1f}ms, p90 {p90 * 1000:.1f}ms, "
+            f"p99 {p99 * 1000:.1f}ms, max {worst * 1000:.1f}ms\n"
+            f"Stalls over {monitor.threshold * 1000:.0f}ms: {monitor.stalls}"
+        )
+        sites = monitor.top_sites()
+        if sites:
+            msg += "\nBlocking call sites:```"
+            for site, blocked in sites:
+                msg += f"\n~{blocked * 1000:.0f}ms {site}"
+            msg += "```"
+        await self.send_priv(ctx, msg)
+
+    @commands.command()
+    async def defers(self, ctx: commands.Context, reset: Optional[str]):
+        auto_defer = self.client.auto_defer
+        if reset == "reset":
+            auto_defer.reset()
+            await self.send_priv(ctx, "Defer counters reset")
+            return
+        msg = f"Deferred after {auto_defer.threshold}s or when predicted:```"
+        for command, calls in auto_defer.calls.most_common():
+            msg += (
+                f"\n{command}: {auto_defer.defers[command]}/{calls}"
+                f" ({auto_defer.predicted[command]} predicted),"
+                f" avg {auto_defer.average.get(command, 0) * 1000:.0f}ms"
+            )
+        msg += "```"
+        await self.send_priv(ctx, msg)
+
+    @commands.command()
+    async def db_maintenance(self, ctx: commands.Context):
+        await self.send_priv(
+            ctx, await self.client.get_cog("Maintenance").run_maintenance()
+        )
+
     # endregion
     # region Listeners
     @commands.Cog.listener()
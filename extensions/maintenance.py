@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+# discord import
+import discord
+from discord.ext import commands
+
+# local import
+from extensions.debug import PRZEMEKKK
+from orms.maintenance import (
+    DATABASES,
+    database_name,
+    delete_guild_data,
+    enable_incremental_vacuum,
+    incremental_vacuum,
+    integrity_check,
+    optimize,
+    page_stats,
+    stored_guild_ids,
+    uses_incremental_vacuum,
+)
+
+
+class Maintenance(commands.Cog):
+    def __init__(self, client: commands.Bot):
+        self.client: commands.Bot = client
+        self.bot_config = client.bot_config or {}
+        self.lock = asyncio.Lock()
+
+    async def cog_load(self):
+        self.scheduler = AsyncIOScheduler()
+        # po archiwizacji (4:00), żeby odzyskać miejsce po przeniesionych wierszach
+        self.scheduler.add_job(
+            self.scheduled_maintenance,
+            CronTrigger(hour=5),
+            id="database_maintenance",
+        )
+        self.scheduler.start()
+
+    async def cog_unload(self):
+        self.scheduler.shutdown(wait=False)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        await self.purge_guilds({guild.id})
+
+    def sees_all_guilds(self) -> bool:
+        # proces z częścią shardów (cluster.py) nie wie, na których serwerach
+        # bot jeszcze jest, więc nie może uznać niczego za osierocone
+        shard_ids = getattr(self.client, "shard_ids", None)
+        return self.client.is_ready() and (
+            shard_ids is None or len(shard_ids) == self.client.shard_count
+        )
+
+    async def purge_guilds(self, guild_ids: set[int]) -> int:
+        deleted = 0
+        # partiami, żeby nie blokować pętli zdarzeń na dłużej niż jedną transakcję
+        while batch := delete_guild_data(
+            guild_ids, self.bot_config.get("maintenance_batch_size", 500)
+        ):
+            deleted += batch
+            await asyncio.sleep(0)
+        return deleted
+
+    async def run_maintenance(self) -> str:
+        async with self.lock:
+            report = ["**Database maintenance**"]
+
+            if self.sees_all_guilds():
+                started = time.perf_counter()
+                orphans = stored_guild_ids() - {
+                    guild.id for guild in self.client.guilds
+                }
+                deleted = await self.purge_guilds(orphans) if orphans else 0
+                # po ponownym dodaniu bota konfiguracja musi powstać od nowa
+                self.client.known_guilds.difference_update(orphans)
+                report.append(
+                    f"Orphans: {len(orphans)} guilds, {deleted} rows deleted"
+                    f" in {(time.perf_counter() - started) * 1000:.0f}ms"
+                )
+            else:
+                report.append("Orphans: skipped, not all shards in this process")
+
+            for database in DATABASES:
+                report.append(await self.maintain_database(database))
+                await asyncio.sleep(0)
+
+        return "\n".join(report)
+
+    async def maintain_database(self, database) -> str:
+        name = database_name(database)
+        parts = []
+        try:
+            started = time.perf_counter()
+            mode = optimize(database)
+            parts.append(f"{mode} {(time.perf_counter() - started) * 1000:.0f}ms")
+            await asyncio.sleep(0)
+
+            started = time.perf_counter()
+            pages_before, free_before = page_stats(database)
+            if uses_incremental_vacuum(database):
+                reclaimed = 0
+                step = self.bot_config.get("maintenance_vacuum_pages", 256)
+                while batch := incremental_vacuum(database, step):
+                    reclaimed += batch
+                    await asyncio.sleep(0)
+                parts.append(f"incremental vacuum reclaimed {reclaimed} pages")
+            else:
+                # jednorazowe przejście na auto_vacuum=incremental pełnym VACUUM
+                await asyncio.to_thread(enable_incremental_vacuum, database.database)
+                parts.append(
+                    f"full vacuum (enabled incremental) reclaimed"
+                    f" {pages_before - page_stats(database)[0]} pages"
+                )
+            parts[-1] += (
+                f" of {free_before} free / {pages_before}"
+                f" in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+
+            started = time.perf_counter()
+            problems = await asyncio.to_thread(integrity_check, database.database)
+            parts.append(
+                f"integrity {'; '.join(problems[:5])}"
+                f" {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+        except Exception as e:
+            parts.append(f"failed: {type(e).__name__}: {e}")
+        return f"{name}: " + ", ".join(parts)
+
+    async def scheduled_maintenance(self):
+        # przy kilku procesach bazy utrzymuje tylko lider
+        if not self.client.leader.try_acquire():
+            return
+        report = await self.run_maintenance()
+        try:
+            owner = self.client.get_user(PRZEMEKKK) or await self.client.fetch_user(
+                PRZEMEKKK
+            )
+        except discord.HTTPException:
+            return
+        self.client.send_queue.send_log(owner, report)
+
+
+async def setup(client: commands.Bot):
+    await client.add_cog(Maintenance(client))
@@ -1,4 +1,6 @@
 from peewee import (
+    fn,
+    SQL,
     Model,
     SqliteDatabase,
     AutoField,
@@ -8,6 +10,14 @@ from peewee import (
     TimeField,
 )
 from os import path
+from playhouse.sqlite_ext import AutoIncrementField
+from datetime import date as dtdate, datetime, timedelta
+from datetime import time as dttime
+from heapq import merge
+from typing import Collection, Iterator, Optional
+from zoneinfo import ZoneInfo
+
+from orms.configs import guild_timezone
 
 database = SqliteDatabase(
     path.join("database", "calendar.db")
@@ -20,7 +30,9 @@ class BaseModel(Model):
 
 
 class Event(BaseModel):
-    id = AutoField()  # Auto-incrementujące pole ID
+    # AUTOINCREMENT: zarchiwizowane wydarzenia zachowują ID, więc SQLite nie może
+    # ich ponownie przydzielić nowym wydarzeniom
+    id = AutoIncrementField()
     title = TextField()  # Nazwa wydarzenia (wymagane)
     message = TextField(null=True)  # Wiadomość (opcjonalnie)
     event_type = TextField()  # Typ wydarzenia (wymagane)
@@ -29,6 +41,676 @@ class Event(BaseModel):
     time = TimeField(null=True)  # Czas wydarzenia (opcjonalnie)
     guild_id = IntegerField()  # ID serwera (wymagane)
     location = TextField(null=True)  # Lokalizacja (opcjonalnie)
+    start_ts = IntegerField(null=True)  # Początek (UTC epoch) w strefie serwera
 
     class Meta:
         table_name = "events"  # Nazwa tabeli w bazie
+        indexes = (
+            (("guild_id", "start_ts"), False),
+            (("guild_id", "role_id", "date", "time"), False),
+        )
+
+
+class ArchivedEvent(Event):
+    """Past events moved out of `events` by `archive_events`, ids are kept."""
+
+    class Meta:
+        table_name = "events_archive"  # Nazwa tabeli w bazie
+        indexes = ((("guild_id", "start_ts"), False),)
+
+
+# kolumny wczytywane do `EventRecord`, w kolejności jego argumentów
+RECORD_COLUMNS = (
+    "id",
+    "title",
+    "message",
+    "event_type",
+    "role_id",
+    "date",
+    "time",
+    "guild_id",
+    "location",
+    "start_ts",
+)
+
+
+class EventRecord:
+    """
+    Read-only event for display code. Rows are fetched as tuples and kept in
+    slots, without the field descriptors and `__data__`/dirty state of a model
+    instance. Writes go through `Event`.
+    """
+
+    __slots__ = RECORD_COLUMNS
+
+    def __init__(
+        self,
+        id: int | str,
+        title: str,
+        message: Optional[str],
+        event_type: str,
+        role_id: Optional[int],
+        date: dtdate,
+        time: Optional[dttime],
+        guild_id: int,
+        location: Optional[str],
+        start_ts: int,
+    ):
+        self.id = id
+        self.title = title
+        self.message = message
+        self.event_type = event_type
+        self.role_id = role_id
+        self.date = date
+        self.time = time
+        self.guild_id = guild_id
+        self.location = location
+        self.start_ts = start_ts
+
+    def __repr__(self) -> str:
+        return f"<EventRecord #{self.id} {self.date} {self.title!r}>"
+
+
+def _record_select(model: type[Event]):
+    return model.select(*(getattr(model, column) for column in RECORD_COLUMNS))
+
+
+def _parse_date(value) -> Optional[dtdate]:
+    # fromisoformat jest wielokrotnie szybsze od strptime, którego używa peewee
+    try:
+        return dtdate.fromisoformat(value)
+    except (TypeError, ValueError):
+        return Event.date.python_value(value)
+
+
+def _parse_time(value) -> Optional[dttime]:
+    try:
+        return dttime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return Event.time.python_value(value)
+
+
+def _records(query) -> Iterator[EventRecord]:
+    # surowy kursor, bez konwersji wierszy przez peewee
+    for (
+        event_id,
+        title,
+        message,
+        event_type,
+        role_id,
+        day,
+        time,
+        guild_id,
+        location,
+        start_ts,
+    ) in database.execute(query):
+        yield EventRecord(
+            event_id,
+            title,
+            message,
+            event_type,
+            role_id,
+            _parse_date(day),
+            _parse_time(time),
+            guild_id,
+            location,
+            start_ts,
+        )
+
+
+class RecurringEvent(BaseModel):
+    id = AutoField()  # Auto-incrementujące pole ID
+    title = TextField()  # Nazwa wydarzenia (wymagane)
+    message = TextField(null=True)  # Wiadomość (opcjonalnie)
+    event_type = TextField()  # Typ wydarzenia (wymagane)
+    role_id = IntegerField(null=True)  # ID roli (opcjonalnie)
+    time = TimeField(null=True)  # Czas wydarzenia (opcjonalnie)
+    guild_id = IntegerField()  # ID serwera (wymagane)
+    location = TextField(null=True)  # Lokalizacja (opcjonalnie)
+    start_date = DateField()  # Data pierwszego wystąpienia (wymagane)
+    until_date = DateField(null=True)  # Data ostatniego wystąpienia (opcjonalnie)
+    interval = IntegerField(default=1)  # Co ile tygodni się powtarza
+    exceptions = TextField(null=True)  # Pominięte daty (RRRR-MM-DD, po przecinku)
+
+    class Meta:
+        table_name = "recurring_events"  # Nazwa tabeli w bazie
+        indexes = ((("guild_id", "start_date"), False),)
+
+    @property
+    def display_id(self) -> str:
+        return f"R{self.id}"
+
+    def skipped_dates(self) -> set[dtdate]:
+        if not self.exceptions:
+            return set()
+        return {dtdate.fromisoformat(day) for day in self.exceptions.split(",") if day}
+
+    def skip(self, day: dtdate) -> None:
+        skipped = self.skipped_dates()
+        skipped.add(_as_date(day))
+        self.exceptions = ",".join(sorted(day.isoformat() for day in skipped))
+
+    def occurrences(
+        self,
+        start: Optional[dtdate] = None,
+        end: Optional[dtdate] = None,
+        tz: Optional[ZoneInfo] = None,
+    ) -> Iterator[EventRecord]:
+        """
+        Lazily yields occurrences between `start` and `end` (inclusive) as
+        `EventRecord`s. Without `end` and `until_date` the generator is infinite.
+        """
+        step = timedelta(weeks=self.interval or 1)
+        day = _as_date(self.start_date)
+        if start is not None and start > day:
+            periods = -(-(start - day).days // step.days)
+            day += step * periods
+
+        last = _as_date(self.until_date) if self.until_date else None
+        if end is not None:
+            last = min(last, end) if last else end
+
+        tz = tz or guild_timezone(self.guild_id)
+        skipped = self.skipped_dates()
+        while last is None or day <= last:
+            if day not in skipped:
+                yield self.occurrence(day, tz)
+            day += step
+
+    def occurrence(self, day: dtdate, tz: Optional[ZoneInfo] = None) -> EventRecord:
+        day = _as_date(day)
+        return EventRecord(
+            self.display_id,
+            self.title,
+            self.message,
+            self.event_type,
+            self.role_id,
+            day,
+            self.time,
+            self.guild_id,
+            self.location,
+            start_timestamp(day, self.time, tz or guild_timezone(self.guild_id)),
+        )
+
+
+class GuildDataVersion(BaseModel):
+    guild_id = IntegerField(primary_key=True)  # ID serwera
+    version = IntegerField(default=0)  # Zwiększane przy każdej zmianie wydarzeń
+
+    class Meta:
+        table_name = "guild_data_versions"  # Nazwa tabeli w bazie
+        without_rowid = True
+
+
+class Subscription(BaseModel):
+    id = AutoField()  # Auto-incrementujące pole ID
+    guild_id = IntegerField()  # ID serwera (wymagane)
+    user_id = IntegerField()  # ID użytkownika (wymagane)
+    role_id = IntegerField(null=True)  # Tylko wydarzenia tej roli (opcjonalnie)
+    event_type = TextField(null=True)  # Tylko wydarzenia tego typu (opcjonalnie)
+    failures = IntegerField(default=0)  # Kolejne odrzucone wiadomości prywatne
+    retry_ts = IntegerField(default=0)  # Przed tą chwilą (UTC epoch) nie wysyłać
+
+    class Meta:
+        table_name = "subscriptions"  # Nazwa tabeli w bazie
+        indexes = ((("guild_id", "user_id"), False),)
+
+
+def data_version(guild_id: int) -> int:
+    row = GuildDataVersion.get_or_none(GuildDataVersion.guild_id == guild_id)
+    return row.version if row else 0
+
+
+def data_versions() -> dict[int, int]:
+    """Data versions of all guilds, for validating many cached entries at once."""
+    return dict(
+        GuildDataVersion.select(
+            GuildDataVersion.guild_id, GuildDataVersion.version
+        ).tuples()
+    )
+
+
+def bump_data_version(guild_id: int) -> None:
+    """Marks everything cached or precomputed for the guild as stale."""
+    GuildDataVersion.insert(guild_id=guild_id, version=1).on_conflict(
+        conflict_target=[GuildDataVersion.guild_id],
+        update={GuildDataVersion.version: GuildDataVersion.version + 1},
+    ).execute()
+
+
+def _as_date(value) -> dtdate:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def start_timestamp(day: dtdate, time: Optional[dttime], tz: ZoneInfo) -> int:
+    """
+    UTC epoch of the event start in the guild timezone. Events without time
+    start at local midnight, so they sort before the timed ones of that day.
+    """
+    if isinstance(time, datetime):
+        time = time.time()
+    return int(
+        datetime.combine(_as_date(day), time or dttime.min, tzinfo=tz).timestamp()
+    )
+
+
+def event_sort_key(event: EventRecord):
+    return event.start_ts
+
+
+def _select_between(
+    model: type[Event],
+    guild_id: int,
+    start: Optional[dtdate],
+    end: Optional[dtdate],
+    tz: ZoneInfo,
+    role_ids: Optional[Collection[int]] = None,
+):
+    if role_ids is not None:
+        return _select_roles_between(model, guild_id, start, end, role_ids)
+    events = (
+        _record_select(model).where(model.guild_id == guild_id).order_by(model.start_ts)
+    )
+    if start is not None:
+        events = events.where(model.start_ts >= start_timestamp(start, None, tz))
+    if end is not None:
+        events = events.where(
+            model.start_ts < start_timestamp(end + timedelta(days=1), None, tz)
+        )
+    return events
+
+
+def _select_roles_between(
+    model: type[Event],
+    guild_id: int,
+    start: Optional[dtdate],
+    end: Optional[dtdate],
+    role_ids: Collection[int],
+):
+    # `role_id IN (...) OR role_id IS NULL` nie używa zakresu dat z indeksu
+    # (guild_id, role_id, date), dlatego dwie gałęzie w jednym UNION ALL;
+    # daty lokalne zamiast start_ts, bo tylko one są w indeksie
+    def select(role):
+        events = _record_select(model).where((model.guild_id == guild_id) & role)
+        if start is not None:
+            events = events.where(model.date >= start)
+        if end is not None:
+            events = events.where(model.date <= end)
+        return events
+
+    return (
+        select(model.role_id.in_(list(role_ids))) + select(model.role_id.is_null())
+    ).order_by(SQL("start_ts"))
+
+
+# typy wydarzeń, które nie powinny na siebie nachodzić dla jednej roli
+CONFLICT_TYPES = ("test", "exam", "retake")
+# zakładany czas trwania wydarzenia z godziną
+CONFLICT_WINDOW = timedelta(hours=2)
+
+
+def _overlaps(time: Optional[dttime], other: Optional[dttime], day: dtdate) -> bool:
+    if time is None or other is None:
+        return True
+    delta = datetime.combine(day, time) - datetime.combine(day, other)
+    return abs(delta) < CONFLICT_WINDOW
+
+
+def find_conflicts(
+    guild_id: int,
+    role_id: Optional[int],
+    day: dtdate,
+    time: Optional[dttime] = None,
+    exclude_id: Optional[int] = None,
+    tz: Optional[ZoneInfo] = None,
+) -> list[EventRecord]:
+    """
+    Tests and exams of the same role overlapping an event on `day` at `time`.
+    Events without time take the whole day, timed ones last `CONFLICT_WINDOW`.
+    Events for everyone conflict with every role. One-off events are looked up
+    on the (guild_id, start_ts) index.
+    """
+    day = _as_date(day)
+    tz = tz or guild_timezone(guild_id)
+    events = _record_select(Event).where(
+        (Event.guild_id == guild_id)
+        & (Event.start_ts >= start_timestamp(day, None, tz))
+        & (Event.start_ts < start_timestamp(day + timedelta(days=1), None, tz))
+        & (Event.date == day)
+        & Event.event_type.in_(CONFLICT_TYPES)
+    )
+    if time is not None:
+        start = datetime.combine(day, time)
+        events = events.where(
+            Event.time.is_null()
+            | Event.time.between(
+                max(start - CONFLICT_WINDOW, datetime.combine(day, dttime.min)).time(),
+                min(start + CONFLICT_WINDOW, datetime.combine(day, dttime.max)).time(),
+            )
+        )
+    # wydarzenie dla wszystkich koliduje z każdą rolą, a wydarzenie roli
+    # z innymi wydarzeniami tej roli i tymi dla wszystkich
+    if role_id is not None:
+        events = events.where(Event.role_id.is_null() | (Event.role_id == role_id))
+    if exclude_id is not None:
+        events = events.where(Event.id != exclude_id)
+    conflicts = [
+        event for event in _records(events) if _overlaps(time, event.time, day)
+    ]
+
+    rules = RecurringEvent.select().where(
+        (RecurringEvent.guild_id == guild_id)
+        & (RecurringEvent.start_date <= day)
+        & (RecurringEvent.until_date.is_null() | (RecurringEvent.until_date >= day))
+        & RecurringEvent.event_type.in_(CONFLICT_TYPES)
+    )
+    if role_id is not None:
+        rules = rules.where(
+            RecurringEvent.role_id.is_null() | (RecurringEvent.role_id == role_id)
+        )
+    for rule in rules:
+        for occurrence in rule.occurrences(day, day, tz):
+            if _overlaps(time, occurrence.time, day):
+                conflicts.append(occurrence)
+
+    return sorted(conflicts, key=event_sort_key)
+
+
+def event_counts(
+    guild_id: int,
+    start: dtdate,
+    end: dtdate,
+    tz: Optional[ZoneInfo] = None,
+) -> list[tuple[int, str, int, int]]:
+    """
+    (day, event_type, role_id, count) rows between `start` and `end` (inclusive)
+    for statistics, aggregated in SQL. `day` counts from `start`, events without
+    a role have role_id 0. Recurring rules add one row per occurrence.
+    """
+    tz = tz or guild_timezone(guild_id)
+    rows = []
+    for model in (Event, ArchivedEvent):
+        day = (fn.julianday(model.date) - fn.julianday(start)).cast("INTEGER")
+        query = (
+            model.select(
+                day,
+                model.event_type,
+                fn.COALESCE(model.role_id, 0),
+                fn.COUNT(model.id),
+            )
+            .where(
+                (model.guild_id == guild_id)
+                & (model.start_ts >= start_timestamp(start, None, tz))
+                & (model.start_ts < start_timestamp(end + timedelta(days=1), None, tz))
+            )
+            .group_by(model.date, model.event_type, model.role_id)
+        )
+        # surowy kursor, bez konwersji wierszy przez peewee
+        rows.extend(database.execute(query).fetchall())
+
+    rules = RecurringEvent.select().where(
+        (RecurringEvent.guild_id == guild_id)
+        & (RecurringEvent.start_date <= end)
+        & (RecurringEvent.until_date.is_null() | (RecurringEvent.until_date >= start))
+    )
+    for rule in rules:
+        for occurrence in rule.occurrences(start, end, tz):
+            rows.append(
+                ((occurrence.date - start).days, rule.event_type, rule.role_id or 0, 1)
+            )
+    return rows
+
+
+def events_between(
+    guild_id: int,
+    start: Optional[dtdate] = None,
+    end: Optional[dtdate] = None,
+    include_archived: bool = False,
+    tz: Optional[ZoneInfo] = None,
+    role_ids: Optional[Collection[int]] = None,
+) -> Iterator[EventRecord]:
+    """
+    One-off and recurring events of a guild between `start` and `end` (inclusive,
+    local dates in the guild timezone), ordered by start. Recurring rules are
+    expanded only as far as the caller consumes the result. Archived events are
+    only read on request. With `role_ids`, only events for one of these roles
+    or for everyone are returned.
+    """
+    tz = tz or guild_timezone(guild_id)
+    streams = [_records(_select_between(Event, guild_id, start, end, tz, role_ids))]
+    if include_archived:
+        streams.append(
+            _records(_select_between(ArchivedEvent, guild_id, start, end, tz, role_ids))
+        )
+
+    rules = RecurringEvent.select().where(RecurringEvent.guild_id == guild_id)
+    if role_ids is not None:
+        rules = rules.where(
+            RecurringEvent.role_id.in_(list(role_ids))
+            | RecurringEvent.role_id.is_null()
+        )
+    if start is not None:
+        rules = rules.where(
+            RecurringEvent.until_date.is_null() | (RecurringEvent.until_date >= start)
+        )
+    if end is not None:
+        rules = rules.where(RecurringEvent.start_date <= end)
+    streams.extend(rule.occurrences(start, end, tz) for rule in rules)
+
+    return merge(*streams, key=event_sort_key)
+
+
+def get_event(event_id: int, guild_id: int) -> Optional[Event]:
+    """Looks the event up in the hot table first, then in the archive."""
+    return Event.get_or_none(
+        (Event.id == event_id) & (Event.guild_id == guild_id)
+    ) or ArchivedEvent.get_or_none(
+        (ArchivedEvent.id == event_id) & (ArchivedEvent.guild_id == guild_id)
+    )
+
+
+def archive_events(before: dtdate, batch_size: int = 500) -> int:
+    """
+    Moves one batch of events dated before `before` to the archive table.
+    Returns the number of moved events, 0 once nothing is left to archive.
+    """
+    with database.atomic():
+        ids = [
+            event.id
+            for event in Event.select(Event.id)
+            .where(Event.date < before)
+            .order_by(Event.id)
+            .limit(batch_size)
+        ]
+        if not ids:
+            return 0
+        ArchivedEvent.insert_from(
+            Event.select().where(Event.id.in_(ids)),
+            fields=ArchivedEvent._meta.sorted_fields,
+        ).execute()
+        Event.delete().where(Event.id.in_(ids)).execute()
+    return len(ids)
+
+
+def update_start_ts(
+    model: type[Event] = Event,
+    guild_id: Optional[int] = None,
+    only_missing: bool = False,
+) -> int:
+    """
+    Recomputes `start_ts` from date, time and the guild timezone, for one guild
+    (after a timezone change) or for all rows (backfill). Returns updated rows.
+    """
+    query = model.select(model.id, model.date, model.time, model.guild_id)
+    if guild_id is not None:
+        query = query.where(model.guild_id == guild_id)
+    if only_missing:
+        query = query.where(model.start_ts.is_null())
+
+    timezones: dict[int, ZoneInfo] = {}
+    # IMMEDIATE: blokada zapisu od początku, bo odczyt w transakcji odroczonej
+    # nie może później przejść w zapis, gdy pisze inny wątek (database is locked)
+    with database.atomic("IMMEDIATE"):
+        rows = []
+        for event_id, day, time, event_guild_id in query.tuples():
+            if event_guild_id not in timezones:
+                timezones[event_guild_id] = guild_timezone(event_guild_id)
+            rows.append(
+                (start_timestamp(day, time, timezones[event_guild_id]), event_id)
+            )
+        # jedno przygotowane zapytanie dla wszystkich wierszy
+        database.cursor().executemany(
+            f'UPDATE "{model._meta.table_name}" SET "start_ts" = ? WHERE "id" = ?',
+            rows,
+        )
+    return len(rows)
+
+
+# po tylu kolejnych odrzuconych wiadomościach prywatnych (403) subskrypcje
+# użytkownika na serwerze są usuwane
+DM_MAX_FAILURES = 3
+# przerwa po pierwszym odrzuceniu, podwajana przy kolejnych
+DM_RETRY_DELAY = timedelta(days=1)
+
+
+def _subscription_filter(guild_id: int, user_id: int, role_id, event_type):
+    return (
+        (Subscription.guild_id == guild_id)
+        & (Subscription.user_id == user_id)
+        & (
+            Subscription.role_id.is_null()
+            if role_id is None
+            else Subscription.role_id == role_id
+        )
+        & (
+            Subscription.event_type.is_null()
+            if event_type is None
+            else Subscription.event_type == event_type
+        )
+    )
+
+
+def subscribe(
+    guild_id: int,
+    user_id: int,
+    role_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+) -> bool:
+    """False if the same subscription already exists."""
+    if Subscription.get_or_none(
+        _subscription_filter(guild_id, user_id, role_id, event_type)
+    ):
+        return False
+    Subscription.create(
+        guild_id=guild_id, user_id=user_id, role_id=role_id, event_type=event_type
+    )
+    return True
+
+
+def unsubscribe(
+    guild_id: int,
+    user_id: int,
+    role_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    everything: bool = False,
+) -> int:
+    """Deletes one subscription, or all of the user's with `everything`."""
+    query = Subscription.delete()
+    if everything:
+        query = query.where(
+            (Subscription.guild_id == guild_id) & (Subscription.user_id == user_id)
+        )
+    else:
+        query = query.where(
+            _subscription_filter(guild_id, user_id, role_id, event_type)
+        )
+    return query.execute()
+
+
+def user_subscriptions(guild_id: int, user_id: int) -> list[Subscription]:
+    return list(
+        Subscription.select()
+        .where((Subscription.guild_id == guild_id) & (Subscription.user_id == user_id))
+        .order_by(Subscription.id)
+    )
+
+
+def subscribers(
+    guild_id: int,
+) -> dict[int, frozenset[tuple[Optional[int], Optional[str]]]]:
+    """
+    user_id -> set of (role_id, event_type) filters of everyone subscribed in
+    the guild, without users still backing off after rejected messages.
+    """
+    now = int(datetime.now().timestamp())
+    filters: dict[int, set[tuple[Optional[int], Optional[str]]]] = {}
+    for user_id, role_id, event_type in (
+        Subscription.select(
+            Subscription.user_id, Subscription.role_id, Subscription.event_type
+        )
+        .where((Subscription.guild_id == guild_id) & (Subscription.retry_ts <= now))
+        .tuples()
+    ):
+        filters.setdefault(user_id, set()).add((role_id, event_type))
+    return {
+        user_id: frozenset(user_filters) for user_id, user_filters in filters.items()
+    }
+
+
+def subscription_matches(
+    filters: frozenset[tuple[Optional[int], Optional[str]]], event: EventRecord
+) -> bool:
+    # subskrypcja roli obejmuje też wydarzenia dla wszystkich
+    return any(
+        (role_id is None or event.role_id is None or event.role_id == role_id)
+        and (event_type is None or event.event_type == event_type)
+        for role_id, event_type in filters
+    )
+
+
+def record_deliveries(
+    guild_id: int, delivered: list[int], rejected: list[int]
+) -> list[int]:
+    """
+    Resets the failure count of `delivered` users and backs off `rejected`
+    ones. Returns users unsubscribed after `DM_MAX_FAILURES` rejections.
+    """
+    now = int(datetime.now().timestamp())
+    in_guild = Subscription.guild_id == guild_id
+    with database.atomic():
+        if delivered:
+            Subscription.update(failures=0, retry_ts=0).where(
+                in_guild
+                & Subscription.user_id.in_(delivered)
+                & (Subscription.failures > 0)
+            ).execute()
+        if not rejected:
+            return []
+        Subscription.update(failures=Subscription.failures + 1).where(
+            in_guild & Subscription.user_id.in_(rejected)
+        ).execute()
+        unsubscribed = [
+            user_id
+            for (user_id,) in Subscription.select(Subscription.user_id)
+            .where(
+                in_guild
+                & Subscription.user_id.in_(rejected)
+                & (Subscription.failures >= DM_MAX_FAILURES)
+            )
+            .distinct()
+            .tuples()
+        ]
+        if unsubscribed:
+            Subscription.delete().where(
+                in_guild & Subscription.user_id.in_(unsubscribed)
+            ).execute()
+        # 1 dzień, 2 dni, ... od teraz
+        for failures in range(1, DM_MAX_FAILURES):
+            Subscription.update(
+                retry_ts=now + int(DM_RETRY_DELAY.total_seconds()) * 2 ** (failures - 1)
+            ).where(
+                in_guild
+                & Subscription.user_id.in_(rejected)
+                & (Subscription.failures == failures)
+            ).execute()
+    return unsubscribed
@@ -2,9 +2,13 @@ from peewee import (
     Model,
     SqliteDatabase,
     IntegerField,
+    TextField,
 )
 
 from os import path
+from zoneinfo import ZoneInfo
+
+DEFAULT_TIMEZONE = "Europe/Warsaw"
 
 database = SqliteDatabase(
     path.join("database", "configs.db")
@@ -20,7 +24,41 @@ class GuildConfigs(BaseModel):
     guild_id = IntegerField(primary_key=True, null=False, unique=True)
     events_channel_id = IntegerField(null=True)
     logging_channel_id = IntegerField(null=True)
+    timezone = TextField(default=DEFAULT_TIMEZONE)
+    digest_day = IntegerField(default=6)  # Dzień podsumowania tygodnia (0 = pon.)
+    digest_hour = IntegerField(default=12)  # Godzina podsumowania w strefie serwera
+    agenda_channel_id = IntegerField(null=True)  # Kanał przypiętej agendy
+    agenda_message_id = IntegerField(null=True)  # Wiadomość przypiętej agendy
+    agenda_hash = TextField(null=True)  # Hash treści ostatniej wersji agendy
 
     class Meta:
         table_name = "GuildConfigs"
         without_rowid = True
+
+
+# guild_id -> nazwa strefy czasowej, odczytywana z bazy raz na serwer
+_timezones: dict[int, str] = {}
+
+
+def guild_timezone(guild_id: int) -> ZoneInfo:
+    if guild_id not in _timezones:
+        guild_config = GuildConfigs.get_or_none(GuildConfigs.guild_id == guild_id)
+        _timezones[guild_id] = (
+            guild_config.timezone
+            if guild_config and guild_config.timezone
+            else DEFAULT_TIMEZONE
+        )
+    return ZoneInfo(_timezones[guild_id])
+
+
+def forget_guild_timezone(guild_id: int) -> None:
+    """Call after changing the guild's timezone in the database."""
+    _timezones.pop(guild_id, None)
+
+
+def cached_timezones() -> dict[int, str]:
+    return dict(_timezones)
+
+
+def preload_timezones(timezones: dict[int, str]) -> None:
+    _timezones.update(timezones)
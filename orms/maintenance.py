@@ -0,0 +1,132 @@
+import sqlite3
+from typing import Iterable
+
+from peewee import Model, SqliteDatabase
+
+from orms.calendar import (
+    Event,
+    ArchivedEvent,
+    RecurringEvent,
+    Subscription,
+    bump_data_version,
+)
+from orms.configs import GuildConfigs, forget_guild_timezone
+
+# modele z danymi serwerów, usuwane po opuszczeniu serwera przez bota
+# (GuildDataVersion zostaje, żeby po powrocie bota wersje nie zaczynały się od
+# nowa i nie pasowały do starych wpisów w pamięci podręcznej)
+GUILD_MODELS: tuple[type[Model], ...] = (
+    Event,
+    ArchivedEvent,
+    RecurringEvent,
+    Subscription,
+    GuildConfigs,
+)
+DATABASES: tuple[SqliteDatabase, ...] = (
+    Event._meta.database,
+    GuildConfigs._meta.database,
+)
+
+# PRAGMA auto_vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def stored_guild_ids() -> set[int]:
+    guild_ids = set()
+    for model in GUILD_MODELS:
+        guild_ids.update(
+            guild_id for (guild_id,) in model.select(model.guild_id).distinct().tuples()
+        )
+    return guild_ids
+
+
+def delete_guild_data(guild_ids: Iterable[int], batch_size: int = 500) -> int:
+    """
+    Deletes one batch of rows of the given guilds from every model.
+    Returns the number of deleted rows, 0 once nothing is left.
+    """
+    guild_ids = list(guild_ids)
+    deleted = 0
+    for model in GUILD_MODELS:
+        key = model._meta.primary_key
+        with model._meta.database.atomic():
+            deleted += (
+                model.delete()
+                .where(
+                    key.in_(
+                        model.select(key)
+                        .where(model.guild_id.in_(guild_ids))
+                        .limit(batch_size)
+                    )
+                )
+                .execute()
+            )
+    if not deleted:
+        for guild_id in guild_ids:
+            # nic z pamięci podręcznej nie może przetrwać usunięcia danych
+            bump_data_version(guild_id)
+            forget_guild_timezone(guild_id)
+    return deleted
+
+
+def database_name(database: SqliteDatabase) -> str:
+    return database.database.replace("\\", "/").rsplit("/", 1)[-1]
+
+
+def optimize(database: SqliteDatabase) -> str:
+    """
+    Refreshes the query planner statistics. `PRAGMA optimize` only updates
+    tables that already have statistics, so the first run uses ANALYZE.
+    """
+    database.execute_sql("PRAGMA analysis_limit = 1000")
+    if not database.table_exists("sqlite_stat1"):
+        database.execute_sql("ANALYZE")
+        return "analyze"
+    database.execute_sql("PRAGMA optimize")
+    return "optimize"
+
+
+def page_stats(database: SqliteDatabase) -> tuple[int, int]:
+    """(all pages, free pages) of the database file."""
+    page_count = database.execute_sql("PRAGMA page_count").fetchone()[0]
+    freelist_count = database.execute_sql("PRAGMA freelist_count").fetchone()[0]
+    return page_count, freelist_count
+
+
+def uses_incremental_vacuum(database: SqliteDatabase) -> bool:
+    mode = database.execute_sql("PRAGMA auto_vacuum").fetchone()[0]
+    return mode == AUTO_VACUUM_INCREMENTAL
+
+
+def enable_incremental_vacuum(path: str) -> None:
+    """
+    Switches an existing database to incremental auto vacuum, which only takes
+    effect after a full VACUUM. Blocking, run it outside of the event loop.
+    """
+    connection = sqlite3.connect(path, timeout=30)
+    try:
+        connection.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}").fetchall()
+        connection.execute("VACUUM").fetchall()
+    finally:
+        connection.close()
+
+
+def incremental_vacuum(database: SqliteDatabase, pages: int) -> int:
+    """Frees up to `pages` pages, returns how many were reclaimed."""
+    before = page_stats(database)[1]
+    # każdy krok zapytania zwalnia jedną stronę, a sqlite3 dla zapytań bez kolumn
+    # robi tylko jeden krok; executescript wykonuje je do końca
+    database.connection().executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+    return before - page_stats(database)[1]
+
+
+def integrity_check(path: str) -> list[str]:
+    """
+    Runs `PRAGMA integrity_check` on a separate read-only connection, so it
+    can run in a thread. Returns ["ok"] for a healthy database.
+    """
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    try:
+        return [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    finally:
+        connection.close()
@@ -0,0 +1,83 @@
+from peewee import Model, fn
+from playhouse.migrate import SqliteMigrator, migrate
+
+from orms.calendar import Event, ArchivedEvent, update_start_ts
+from orms.configs import GuildConfigs
+
+
+def _add_missing_column(model: type[Model], column: str) -> bool:
+    database = model._meta.database
+    table = model._meta.table_name
+    if column in [c.name for c in database.get_columns(table)]:
+        return False
+    migrate(
+        SqliteMigrator(database).add_column(table, column, model._meta.fields[column])
+    )
+    return True
+
+
+def _use_autoincrement(model: type[Model]) -> None:
+    """
+    Rebuilds the table with an AUTOINCREMENT key (SQLite cannot alter it in
+    place), keeping the rows and their ids.
+    """
+    database = model._meta.database
+    table = model._meta.table_name
+    (sql,) = database.execute_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    if "AUTOINCREMENT" in sql.upper():
+        return
+    columns = ", ".join(f'"{c.name}"' for c in database.get_columns(table))
+    with database.atomic():
+        database.execute_sql(f'ALTER TABLE "{table}" RENAME TO "{table}_old"')
+        # indeksy przechodzą razem z tabelą, a ich nazwy są potrzebne nowej
+        for index in database.get_indexes(f"{table}_old"):
+            database.execute_sql(f'DROP INDEX "{index.name}"')
+        model.create_table(safe=False)
+        database.execute_sql(
+            f'INSERT INTO "{table}" ({columns}) SELECT {columns} FROM "{table}_old"'
+        )
+        database.execute_sql(f'DROP TABLE "{table}_old"')
+
+
+def _seed_sequence(model: type[Model], *others: type[Model]) -> None:
+    """Makes new ids of `model` start above the ids of `others` (archives)."""
+    database = model._meta.database
+    table = model._meta.table_name
+    highest = max(
+        [other.select(fn.MAX(other.id)).scalar() or 0 for other in (model, *others)]
+        + [
+            row[0]
+            for row in database.execute_sql(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)
+            )
+        ]
+    )
+    with database.atomic():
+        database.execute_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+        database.execute_sql(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, highest)
+        )
+
+
+def run_migrations() -> None:
+    """Brings databases created by older versions up to the current models."""
+    for column in (
+        "timezone",
+        "agenda_channel_id",
+        "agenda_message_id",
+        "agenda_hash",
+        "digest_day",
+        "digest_hour",
+    ):
+        _add_missing_column(GuildConfigs, column)
+
+    for model in (Event, ArchivedEvent):
+        if _add_missing_column(model, "start_ts"):
+            update_start_ts(model, only_missing=True)
+        model._schema.create_indexes(safe=True)
+
+    # zarchiwizowane wydarzenia zachowują ID, więc nowe nie mogą ich powtórzyć
+    _use_autoincrement(Event)
+    _seed_sequence(Event, ArchivedEvent)
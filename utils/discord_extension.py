@@ -1,5 +1,13 @@
-from typing import Optional, Union, List, Any
+from typing import Optional, Union, List, Any, Awaitable, Callable
+from collections import Counter
 from datetime import datetime
+from enum import IntEnum
+from functools import wraps
+from itertools import count
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import logging
+import time
 
 import discord
 from discord.app_commands import Translator, locale_str
@@ -9,6 +17,8 @@ from discord.enums import Locale
 
 from utils.utils import JSONTranslator
 
+logger = logging.getLogger(__name__)
+
 
 class EmbedError(Exception): ...
 
@@ -17,8 +27,21 @@ class ExtEmbedGenerator:
     """
     author: dict("name", Optional["icon_url"], Optional["url"])
     fields: list(BatterEmbed.Field)
+
+    `embed` truncates everything to Discord limits, `embeds` splits long content
+    over several embeds and `messages` groups them into sendable messages.
     """
 
+    TITLE_LIMIT = 256
+    DESCRIPTION_LIMIT = 4096
+    FIELDS_LIMIT = 25
+    FIELD_NAME_LIMIT = 256
+    FIELD_VALUE_LIMIT = 1024
+    FOOTER_LIMIT = 2048
+    AUTHOR_LIMIT = 256
+    EMBED_LIMIT = 6000
+    EMBEDS_PER_MESSAGE = 10
+
     class Field:
         def __init__(self, name: str, value: str, inline: bool = False) -> None:
             self.name: str = name
@@ -54,33 +77,114 @@ class ExtEmbedGenerator:
         embed = discord.Embed(
             colour=colour,
             color=color,
-            title=self.translator.translate_sync(title),
+            title=_fit(self.translator.translate_sync(title), self.TITLE_LIMIT),
             type=embed_type,
             url=url,
-            description=self.translator.translate_sync(description),
+            description=_fit(
+                self.translator.translate_sync(description), self.DESCRIPTION_LIMIT
+            ),
             timestamp=timestamp,
         )
-        if fields:
-            for field in fields:
-                _name = self.translator.translate_sync(field.name)
-                _value = self.translator.translate_sync(field.value)
-
-                embed.add_field(name=_name, value=_value, inline=field.inline)
         if thumbnail:
             embed.set_thumbnail(url=thumbnail)
         if footer:
-            embed.set_footer(text=self.translator.translate_sync(footer))
+            embed.set_footer(
+                text=_fit(self.translator.translate_sync(footer), self.FOOTER_LIMIT)
+            )
         if author and "name" in author:
             embed.set_author(
-                name=self.translator.translate_sync(author["name"]),
+                name=_fit(
+                    self.translator.translate_sync(author["name"]), self.AUTHOR_LIMIT
+                ),
                 icon_url=(author["icon_url"] if "icon_url" in author else None),
                 url=(author["url"] if "url" in author else None),
             )
         if image:
             embed.set_image(url=image)
+        if fields:
+            for _name, _value, inline in self._field_parts(fields):
+                if (
+                    len(embed.fields) >= self.FIELDS_LIMIT
+                    or len(embed) + len(_name) + len(_value) > self.EMBED_LIMIT
+                ):
+                    break
+                embed.add_field(name=_name, value=_value, inline=inline)
 
         return embed
 
+    def embeds(
+        self,
+        colour: Optional[Union[int, discord.Colour]] = None,
+        color: Optional[Union[int, discord.Colour]] = None,
+        fields: Optional[List[Field]] = None,
+        footer: Optional[Any] = None,
+        **kwargs,
+    ) -> list[discord.Embed]:
+        """
+        Like `embed`, but fields that don't fit (count, field or embed size)
+        continue in further embeds instead of being dropped. Too long field
+        values are split on line breaks. The footer goes on the last embed.
+        """
+        first = self.embed(colour=colour, color=color, **kwargs)
+        footer = (
+            _fit(self.translator.translate_sync(footer), self.FOOTER_LIMIT)
+            if footer
+            else ""
+        )
+        embeds = [first]
+        for _name, _value, inline in self._field_parts(fields or []):
+            current = embeds[-1]
+            if (
+                len(current.fields) >= self.FIELDS_LIMIT
+                or len(current) + len(_name) + len(_value) + len(footer)
+                > self.EMBED_LIMIT
+            ):
+                current = discord.Embed(colour=first.colour)
+                embeds.append(current)
+            current.add_field(name=_name, value=_value, inline=inline)
+        if footer:
+            embeds[-1].set_footer(text=footer)
+        return embeds
+
+    @classmethod
+    def messages(cls, embeds: list[discord.Embed]) -> list[list[discord.Embed]]:
+        """Groups embeds into messages of at most 10 embeds and 6000 characters."""
+        messages: list[list[discord.Embed]] = []
+        size = 0
+        for embed in embeds:
+            if (
+                not messages
+                or len(messages[-1]) >= cls.EMBEDS_PER_MESSAGE
+                or size + len(embed) > cls.EMBED_LIMIT
+            ):
+                messages.append([])
+                size = 0
+            messages[-1].append(embed)
+            size += len(embed)
+        return messages
+
+    def _field_parts(self, fields: List[Field]):
+        for field in fields:
+            _name = _fit(
+                self.translator.translate_sync(field.name) or "\u200b",
+                self.FIELD_NAME_LIMIT,
+            )
+            _value = self.translator.translate_sync(field.value) or "\u200b"
+            for i, part in enumerate(_split_lines(_value, self.FIELD_VALUE_LIMIT)):
+                yield (_name if i == 0 else "\u200b"), part, field.inline
+
+
+def _fit(text: Optional[str], limit: int) -> Optional[str]:
+    if text is None or len(text) <= limit:
+        return text
+    return text[: limit - 1] + "…"
+
+
+def _split_lines(text: str, limit: int) -> list[str]:
+    if len(text) <= limit:
+        return [text]
+    return _chunk_lines(text.split("\n"), limit)
+
 
 class ExtView(discord.ui.View):
     def __init__(
@@ -149,3 +253,501 @@ class ExtButton(discord.ui.Button):
             emoji=emoji,
             row=row,
         )
+
+
+class Priority(IntEnum):
+    INTERACTION = 0
+    REMINDER = 1
+    DIGEST = 2
+    LOGGING = 3
+
+
+class TokenBucket:
+    """
+    Per-route limiter, `rate` sends per `per` seconds, slowed down on 429 and
+    sped up again by one send for every `per` seconds without one.
+    """
+
+    def __init__(self, rate: int = 5, per: float = 5.0):
+        self.rate = rate
+        self.default_rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.rate < self.default_rate and now >= self.blocked_until + self.per:
+            quiet = int((now - self.blocked_until) // self.per)
+            self.rate = min(self.default_rate, self.rate + quiet)
+            self.blocked_until += quiet * self.per
+        self.tokens = min(
+            self.rate, self.tokens + (now - self.updated) * self.rate / self.per
+        )
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+    def rate_limited(self, retry_after: float):
+        self.tokens = 0
+        self.blocked_until = time.monotonic() + retry_after
+        if self.rate > 1:
+            self.rate -= 1
+
+    def idle(self, now: float) -> bool:
+        """Full, not blocked and at the default rate, i.e. like a new bucket."""
+        if now < self.blocked_until:
+            return False
+        self._refill(now)
+        return self.rate == self.default_rate and self.tokens >= self.rate
+
+
+class SendQueue:
+    """
+    Central queue for outbound messages.
+
+    Interaction responses go through their own lane, so they never wait behind
+    background sends. Background sends (reminders > digests > logging) are
+    ordered by priority and throttled per route with `TokenBucket`s that back
+    off on rate limits. Consecutive log messages to one channel are coalesced.
+    """
+
+    MAX_RETRIES = 3
+    # przy tylu kubełkach usuwane są bezczynne (np. trasy DM do subskrybentów)
+    PRUNE_BUCKETS = 256
+
+    def __init__(self, interactive_workers: int = 8, background_workers: int = 4):
+        self.interactive_workers = interactive_workers
+        self.background_workers = background_workers
+        self._interactive: asyncio.Queue = asyncio.Queue()
+        self._background: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._prune_at = self.PRUNE_BUCKETS
+        self._log_buffers: dict[int, list[str]] = {}
+        self._counter = count()
+        self._workers: list[asyncio.Task] = []
+
+    def start(self):
+        self._workers = [
+            asyncio.create_task(self._work(self._interactive))
+            for _ in range(self.interactive_workers)
+        ] + [
+            asyncio.create_task(self._work(self._background))
+            for _ in range(self.background_workers)
+        ]
+
+    def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+    async def drain(self, timeout: float = 10) -> bool:
+        """Waits until everything queued so far is sent, False on timeout."""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(self._interactive.join(), self._background.join()),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _bucket(self, route: str) -> TokenBucket:
+        if route not in self._buckets:
+            if len(self._buckets) >= self._prune_at:
+                self._prune_buckets()
+            self._buckets[route] = TokenBucket()
+        return self._buckets[route]
+
+    def _prune_buckets(self):
+        # pełny kubełek nie ma czekających wysyłek, więc można go odtworzyć
+        now = time.monotonic()
+        for route in [r for r, bucket in self._buckets.items() if bucket.idle(now)]:
+            del self._buckets[route]
+        # kolejne sprawdzenie dopiero po podwojeniu liczby aktywnych kubełków
+        self._prune_at = max(self.PRUNE_BUCKETS, 2 * len(self._buckets))
+
+    async def send(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        *,
+        priority: Priority,
+        route: Optional[str] = None,
+    ) -> Any:
+        """Queues `factory()` and waits for its result."""
+        future = asyncio.get_running_loop().create_future()
+        item = (priority, next(self._counter), factory, route, future, 0)
+        if priority == Priority.INTERACTION:
+            self._interactive.put_nowait(item)
+        else:
+            self._background.put_nowait(item)
+        return await future
+
+    async def respond(self, interaction: discord.Interaction, *args, **kwargs):
+        """
+        Sends the interaction response, or a followup if already responded.
+        The first reply after `defer` replaces the "thinking..." message, or
+        deletes it when the reply's visibility differs from the defer's.
+        """
+
+        async def factory():
+            async with _response_lock(interaction):
+                if not interaction.response.is_done():
+                    return await interaction.response.send_message(*args, **kwargs)
+                deferred = interaction.extras.pop("deferred", None)
+                if deferred is not None:
+                    if kwargs.get("ephemeral", False) != deferred:
+                        await interaction.delete_original_response()
+                    elif len(args) <= 1 and EDIT_ARGS.issuperset(kwargs):
+                        return await interaction.edit_original_response(
+                            **_edit_kwargs(args, kwargs)
+                        )
+                return await interaction.followup.send(*args, **kwargs)
+
+        return await self.send(factory, priority=Priority.INTERACTION)
+
+    async def defer(
+        self, interaction: discord.Interaction, ephemeral: bool = False
+    ) -> bool:
+        """Defers the interaction unless it was already responded to."""
+        # poza kolejką, żeby odroczenie zdążyło przed terminem nawet wtedy,
+        # gdy odpowiedzi czekają na wolnego workera
+        async with _response_lock(interaction):
+            if interaction.response.is_done():
+                return False
+            await interaction.response.defer(thinking=True, ephemeral=ephemeral)
+            interaction.extras["deferred"] = ephemeral
+            return True
+
+    async def send_to(
+        self,
+        channel: discord.abc.Messageable,
+        *args,
+        priority: Priority = Priority.DIGEST,
+        **kwargs,
+    ):
+        return await self.send(
+            lambda: channel.send(*args, **kwargs),
+            priority=priority,
+            route=f"channel:{getattr(channel, 'id', id(channel))}",
+        )
+
+    def send_log(self, channel: discord.abc.Messageable, content: str):
+        """Buffers `content`, all buffered lines are sent as one message."""
+        channel_id = getattr(channel, "id", id(channel))
+        if channel_id in self._log_buffers:
+            self._log_buffers[channel_id].append(content)
+            return
+        self._log_buffers[channel_id] = [content]
+
+        async def flush():
+            lines = self._log_buffers.pop(channel_id, [])
+            for chunk in _chunk_lines(lines, 2000):
+                await channel.send(chunk)
+
+        self._background.put_nowait(
+            (
+                Priority.LOGGING,
+                next(self._counter),
+                flush,
+                f"channel:{channel_id}",
+                None,
+                0,
+            )
+        )
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            priority, order, factory, route, future, retries = item
+            try:
+                if route:
+                    await self._bucket(route).acquire()
+                result = await factory()
+            except discord.RateLimited as e:
+                # discord.py sam ponawia 429 z krótkim czasem oczekiwania, tu
+                # trafiają tylko dłuższe (zob. max_ratelimit_timeout w bot.py)
+                if route and retries < self.MAX_RETRIES:
+                    self._bucket(route).rate_limited(e.retry_after)
+                    queue.put_nowait(
+                        (priority, order, factory, route, future, retries + 1)
+                    )
+                elif future and not future.done():
+                    future.set_exception(e)
+                else:
+                    logger.warning(f"Send on route {route} failed: {e}")
+            except Exception as e:
+                if future and not future.done():
+                    future.set_exception(e)
+                else:
+                    logger.warning(f"Send on route {route} failed: {e}")
+            else:
+                if future and not future.done():
+                    future.set_result(result)
+            finally:
+                queue.task_done()
+
+
+# argumenty `send_message`, które da się przenieść do `edit_original_response`
+EDIT_ARGS = frozenset(
+    (
+        "content",
+        "embed",
+        "embeds",
+        "view",
+        "allowed_mentions",
+        "file",
+        "files",
+        "ephemeral",
+    )
+)
+
+
+def _response_lock(interaction: discord.Interaction) -> asyncio.Lock:
+    # discord.py oznacza odpowiedź jako wysłaną dopiero po zapytaniu HTTP, więc
+    # równoległe odroczenie i odpowiedź mogłyby obie trafić do Discorda
+    if "response_lock" not in interaction.extras:
+        interaction.extras["response_lock"] = asyncio.Lock()
+    return interaction.extras["response_lock"]
+
+
+def _edit_kwargs(args: tuple, kwargs: dict) -> dict:
+    kwargs = dict(kwargs)
+    kwargs.pop("ephemeral", None)
+    if args:
+        kwargs["content"] = args[0]
+    files = list(kwargs.pop("files", None) or [])
+    if "file" in kwargs:
+        files.append(kwargs.pop("file"))
+    if files:
+        kwargs["attachments"] = files
+    return kwargs
+
+
+class AutoDefer:
+    """
+    Defers slow application commands before Discord's 3 second deadline.
+
+    A command wrapped with `defer_first` is deferred up front when its average
+    run time is over `predict` seconds (blocking work cannot be interrupted
+    by a timer), otherwise once it runs for `threshold` seconds without
+    responding. Replies then go through `SendQueue.respond` as usual.
+    """
+
+    def __init__(
+        self,
+        send_queue: SendQueue,
+        threshold: float = 1.5,
+        predict: float = 1.0,
+        smoothing: float = 0.2,
+    ):
+        self.send_queue = send_queue
+        self.threshold = threshold
+        self.predict = predict
+        self.smoothing = smoothing
+        self.average: dict[str, float] = {}
+        self.calls: Counter[str] = Counter()
+        self.defers: Counter[str] = Counter()
+        self.predicted: Counter[str] = Counter()
+
+    async def _defer(
+        self, command: str, interaction: discord.Interaction, ephemeral: bool
+    ):
+        if await self.send_queue.defer(interaction, ephemeral):
+            self.defers[command] += 1
+
+    async def _defer_later(
+        self, command: str, interaction: discord.Interaction, ephemeral: bool
+    ):
+        await asyncio.sleep(self.threshold)
+        # rozpoczęte odroczenie musi się dokończyć, nawet gdy komenda już skończyła
+        await asyncio.shield(self._defer(command, interaction, ephemeral))
+
+    async def run(
+        self,
+        command: str,
+        interaction: discord.Interaction,
+        ephemeral: bool,
+        callback: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        self.calls[command] += 1
+        timer = None
+        if self.average.get(command, 0.0) > self.predict:
+            self.predicted[command] += 1
+            await self._defer(command, interaction, ephemeral)
+        else:
+            timer = asyncio.create_task(
+                self._defer_later(command, interaction, ephemeral)
+            )
+        started = time.monotonic()
+        try:
+            return await callback()
+        finally:
+            if timer:
+                timer.cancel()
+            elapsed = time.monotonic() - started
+            self.average[command] = (
+                self.average[command] * (1 - self.smoothing) + elapsed * self.smoothing
+                if command in self.average
+                else elapsed
+            )
+
+    def reset(self):
+        self.average.clear()
+        self.calls.clear()
+        self.defers.clear()
+        self.predicted.clear()
+
+
+def defer_first(ephemeral: bool = False):
+    """
+    Runs a cog's command through `client.auto_defer`. `ephemeral` is the
+    visibility of the "thinking..." message, so of the command's main reply.
+    Place it directly above the function, below the app_commands decorators.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(self, interaction: discord.Interaction, *args, **kwargs):
+            return await self.client.auto_defer.run(
+                func.__qualname__,
+                interaction,
+                ephemeral,
+                lambda: func(self, interaction, *args, **kwargs),
+            )
+
+        return wrapper
+
+    return decorator
+
+
+class AuditLog:
+    """
+    Per-guild buffer of audit entries for the guild's logging channel.
+
+    Entries recorded within `interval` seconds are sent together as one embed,
+    a full buffer (`max_entries`) is sent right away. Sends go through the
+    `SendQueue` logging lane, so bulk operations end up as a few messages.
+    """
+
+    def __init__(
+        self,
+        send_queue: SendQueue,
+        translator: Translator,
+        resolve_channel: Callable[[int], Optional[discord.abc.Messageable]],
+        interval: float = 5,
+        max_entries: int = 25,
+        locale: Locale = Locale.polish,
+    ):
+        self.send_queue = send_queue
+        self.translator = translator
+        self.resolve_channel = resolve_channel
+        self.interval = interval
+        self.max_entries = max_entries
+        self.locale = locale
+        self._buffers: dict[int, list[tuple[int, locale_str]]] = {}
+        self._timers: dict[int, asyncio.Task] = {}
+        # referencje do wysyłek pełnych buforów, pętla trzyma tylko słabe
+        self._sends: set[asyncio.Task] = set()
+
+    def record(self, guild_id: int, entry: locale_str) -> None:
+        buffer = self._buffers.setdefault(guild_id, [])
+        buffer.append((int(time.time()), entry))
+        if len(buffer) >= self.max_entries:
+            # pełny bufor idzie od razu, timer wyśle to, co dojdzie później
+            task = asyncio.create_task(
+                self._send(guild_id, self._buffers.pop(guild_id))
+            )
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+        elif guild_id not in self._timers:
+            self._timers[guild_id] = asyncio.create_task(self._flush_later(guild_id))
+
+    async def flush(self, guild_id: int) -> None:
+        entries = self._buffers.pop(guild_id, None)
+        if entries:
+            await self._send(guild_id, entries)
+
+    async def flush_all(self) -> None:
+        for guild_id in list(self._buffers):
+            await self.flush(guild_id)
+        # pełne bufory wysyłane jeszcze w tle
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+
+    async def _flush_later(self, guild_id: int):
+        try:
+            await asyncio.sleep(self.interval)
+        finally:
+            self._timers.pop(guild_id, None)
+        await self.flush(guild_id)
+
+    async def _send(self, guild_id: int, entries: list[tuple[int, locale_str]]):
+        channel = self.resolve_channel(guild_id)
+        if channel is None:
+            return
+        title = await self.translator.translate(locale_str("audit_title"), self.locale)
+        lines = [
+            f"<t:{timestamp}:T> {await self.translator.translate(entry, self.locale)}"
+            for timestamp, entry in entries
+        ]
+        embeds = [
+            discord.Embed(
+                title=title, description=chunk, color=discord.Color.light_grey()
+            )
+            for chunk in _chunk_lines(lines, ExtEmbedGenerator.DESCRIPTION_LIMIT)
+        ]
+        for message_embeds in ExtEmbedGenerator.messages(embeds):
+            try:
+                await self.send_queue.send_to(
+                    channel,
+                    embeds=message_embeds,
+                    allowed_mentions=discord.AllowedMentions.none(),
+                    priority=Priority.LOGGING,
+                )
+            except discord.HTTPException as e:
+                logger.warning(f"audit log for guild {guild_id} not sent: {e}")
+                return
+
+
+def _chunk_lines(lines: list[str], limit: int) -> list[str]:
+    chunks = []
+    current = ""
+    for line in lines:
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def attachment_expired(url: str, margin: float = 3600) -> bool:
+    """
+    Discord CDN attachment links are signed and expire (hex `ex` parameter),
+    links expiring within `margin` seconds are treated as expired.
+    """
+    expires = parse_qs(urlsplit(url).query).get("ex")
+    if not expires:
+        return False
+    try:
+        return int(expires[0], 16) < time.time() + margin
+    except ValueError:
+        return True
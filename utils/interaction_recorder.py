@@ -0,0 +1,121 @@
+import json
+import random
+import re
+import time
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import discord
+
+from utils.utils import parse_date, parse_time
+
+# typy opcji komend z dokumentacji Discorda
+OPTION_SUBCOMMAND = 1
+OPTION_SUBCOMMAND_GROUP = 2
+OPTION_STRING = 3
+OPTION_USER = 6
+
+# numer wydarzenia, jako id albo zapytanie (#12, R3, ##R3)
+_EVENT_ID = re.compile(r"#{0,2}R?\d+", re.IGNORECASE)
+# klucze wyborów (Literal) komend
+_CHOICE = re.compile(r"calendar_(type|repeat)_[a-z]+|weekday_[0-6]")
+
+# opcje, których wartości decydują o ścieżce kodu
+_EVENT_ID_OPTIONS = (
+    "calendar_show_byid_id",
+    "calendar_skip_id",
+    "calendar_edit_query",
+    "calendar_remove_query",
+)
+_CHOICE_OPTIONS = (
+    "calendar_add_eventtype",
+    "calendar_add_repeat",
+    "calendar_subscription_eventtype",
+    "config_digest_day",
+)
+_DATE_OPTIONS = ("_date", "calendar_add_until")
+_TIME_OPTIONS = ("calendar_add_time",)
+_TIMEZONE_OPTIONS = ("config_timezone",)
+
+
+def _is_timezone(value: str) -> bool:
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def anonymise(name: str, value: str) -> str:
+    """
+    Keeps values that drive the code path (event ids, choice keys, dates,
+    times, timezones), each only in its own options. Other free text (titles,
+    messages, search queries) is replaced by `x`s of the same length.
+    """
+    if (
+        (name in _EVENT_ID_OPTIONS and _EVENT_ID.fullmatch(value))
+        or (name in _CHOICE_OPTIONS and _CHOICE.fullmatch(value))
+        or (name.endswith(_DATE_OPTIONS) and parse_date(value) is not None)
+        or (name in _TIME_OPTIONS and parse_time(value) is not None)
+        or (name in _TIMEZONE_OPTIONS and _is_timezone(value))
+    ):
+        return value
+    return "x" * len(value)
+
+
+def command_path(data: dict) -> tuple[str, list[dict]]:
+    """Full command name and the options of the invoked (sub)command."""
+    names = [data["name"]]
+    options = data.get("options", [])
+    while options and options[0]["type"] in (
+        OPTION_SUBCOMMAND,
+        OPTION_SUBCOMMAND_GROUP,
+    ):
+        names.append(options[0]["name"])
+        options = options[0].get("options", [])
+    return " ".join(names), options
+
+
+class InteractionRecorder:
+    """
+    Appends anonymised slash command interactions (command, options, guild,
+    time) to a JSONL file for `benchmarks.replay`. Users are not recorded.
+    """
+
+    def __init__(self, path: str, sample_rate: float = 1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def record(self, interaction: discord.Interaction) -> None:
+        if interaction.type is not discord.InteractionType.application_command:
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        command, options = command_path(interaction.data)
+        record = {
+            "t": round(time.time(), 3),
+            "guild_id": interaction.guild_id,
+            "command": command,
+            "locale": str(interaction.locale),
+            "options": [
+                {
+                    "name": option["name"],
+                    "type": option["type"],
+                    "value": self._value(option),
+                }
+                for option in options
+            ],
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+    @staticmethod
+    def _value(option: dict) -> Optional[object]:
+        if option["type"] == OPTION_USER:
+            return None
+        if option["type"] == OPTION_STRING:
+            return anonymise(option["name"], option["value"])
+        return option["value"]
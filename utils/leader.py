@@ -0,0 +1,49 @@
+import fcntl
+import json
+import os
+import time
+from typing import Optional, TextIO
+
+
+class LeaderLock:
+    """
+    Leader election between bot processes on one host, based on `flock`.
+
+    The first process to call `try_acquire` keeps the lock for its lifetime.
+    The kernel releases it when that process dies, so the next `try_acquire`
+    of another process takes over. Holder pid and last heartbeat are written
+    into the lock file for inspection.
+    """
+
+    def __init__(self, lock_path: str = os.path.join("database", "leader.lock")):
+        self.lock_path = lock_path
+        self._file: Optional[TextIO] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._file is not None
+
+    def try_acquire(self) -> bool:
+        if self._file is None:
+            lock_file = open(self.lock_path, "a+")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+            self._file = lock_file
+        self._heartbeat()
+        return True
+
+    def release(self) -> None:
+        if self._file is None:
+            return
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+    def _heartbeat(self) -> None:
+        self._file.seek(0)
+        self._file.truncate()
+        json.dump({"pid": os.getpid(), "heartbeat": time.time()}, self._file)
+        self._file.flush()
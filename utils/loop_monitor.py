@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import FrameType
+from typing import Optional
+
+# katalog główny bota, ramki spoza niego (biblioteki) nie są miejscem wywołania
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _location(frame: FrameType) -> str:
+    path = os.path.relpath(frame.f_code.co_filename, PROJECT_ROOT)
+    if path.startswith(".."):
+        path = os.path.basename(frame.f_code.co_filename)
+    return f"{path}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def call_site(frame: FrameType) -> str:
+    """
+    `leaf` for blocking code of the bot itself, otherwise `bot frame -> leaf`,
+    where bot frame is the innermost frame from the bot's own files.
+    """
+    leaf = _location(frame)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_ROOT) and "site-packages" not in filename:
+            own = _location(frame)
+            return own if own == leaf else f"{own} -> {leaf}"
+        frame = frame.f_back
+    return leaf
+
+
+class LoopMonitor:
+    """
+    Measures event loop lag and finds the code that blocks it.
+
+    A heartbeat task sleeps `interval` seconds and records how late it woke
+    up. A watchdog thread checks every `sample_interval` seconds whether the
+    heartbeat is overdue by more than `threshold`; if so, it samples the loop
+    thread's current frame, so each call site collects one sample per
+    `sample_interval` of blocking.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.25,
+        threshold: float = 0.1,
+        sample_interval: float = 0.05,
+        history: int = 2400,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.lags: deque[float] = deque(maxlen=history)
+        self.samples: Counter[str] = Counter()
+        self.stalls = 0
+        self._deadline = float("inf")
+        self._stalled = False
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        # samples i stalls zmienia wątek watchdoga, a czyta i zeruje pętla
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._deadline = time.monotonic() + self.interval + self.threshold
+        self._task = asyncio.create_task(self._heartbeat())
+        self._stop.clear()
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-monitor", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            self._deadline = expected + self.threshold
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.monotonic() - expected))
+
+    def _watch(self):
+        while not self._stop.wait(self.sample_interval):
+            if time.monotonic() <= self._deadline:
+                self._stalled = False
+                continue
+            if not self._stalled:
+                self._stalled = True
+                with self._lock:
+                    self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                site = call_site(frame)
+                with self._lock:
+                    self.samples[site] += 1
+
+    def percentiles(self, *quantiles: float) -> list[float]:
+        lags = sorted(self.lags)
+        if not lags:
+            return [0.0 for _ in quantiles]
+        return [lags[min(len(lags) - 1, int(q * len(lags)))] for q in quantiles]
+
+    def top_sites(self, limit: int = 5) -> list[tuple[str, float]]:
+        """Call sites with the approximate time (s) they blocked the loop."""
+        with self._lock:
+            top = self.samples.most_common(limit)
+        return [(site, count * self.sample_interval) for site, count in top]
+
+    def reset(self):
+        self.lags.clear()
+        with self._lock:
+            self.samples.clear()
+            self.stalls = 0
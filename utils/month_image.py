@@ -0,0 +1,144 @@
+import calendar
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+### siatka miesiąca jako PNG ###
+# funkcje tego modułu działają w osobnym procesie, więc dostają tylko proste dane
+# (bez modeli i tłumacza) i zwracają gotowe bajty obrazu
+#######################
+
+CELL_WIDTH = 200
+CELL_HEIGHT = 130
+HEADER_HEIGHT = 70
+WEEKDAYS_HEIGHT = 30
+LEGEND_HEIGHT = 40
+PADDING = 6
+LINE_HEIGHT = 20
+MAX_EVENTS_PER_CELL = 4
+
+BACKGROUND = (49, 51, 56)
+CELL = (43, 45, 49)
+CELL_OUTSIDE = (37, 38, 42)
+TODAY = (88, 101, 242)
+TEXT = (242, 243, 245)
+TEXT_MUTED = (148, 155, 164)
+
+TYPE_COLORS = {
+    "test": (230, 126, 34),
+    "exam": (237, 66, 69),
+    "retake": (241, 196, 15),
+    "deadline": (155, 89, 182),
+    "other": (128, 132, 142),
+}
+
+
+def _font(size: int, bold: bool = False) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.truetype(
+            "DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf", size
+        )
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _fit(draw: ImageDraw.ImageDraw, text: str, font, width: int) -> str:
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def render_month(
+    year: int,
+    month: int,
+    title: str,
+    weekday_names: list[str],
+    type_labels: dict[str, str],
+    days: dict[int, list[tuple[str, str, str]]],
+    today: Optional[int] = None,
+) -> bytes:
+    """
+    Renders a Monday-first month grid. `days` maps a day of the month to its
+    (time, title, event_type) rows, `today` is highlighted when given.
+    """
+    weeks = calendar.Calendar().monthdayscalendar(year, month)
+    width = CELL_WIDTH * 7
+    grid_top = HEADER_HEIGHT + WEEKDAYS_HEIGHT
+    height = grid_top + CELL_HEIGHT * len(weeks) + LEGEND_HEIGHT
+
+    image = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    title_font = _font(32, bold=True)
+    day_font = _font(16, bold=True)
+    event_font = _font(13)
+
+    draw.text((width / 2, HEADER_HEIGHT / 2), title, TEXT, title_font, anchor="mm")
+    for i, name in enumerate(weekday_names):
+        draw.text(
+            (CELL_WIDTH * i + CELL_WIDTH / 2, HEADER_HEIGHT + WEEKDAYS_HEIGHT / 2),
+            name,
+            TEXT_MUTED,
+            day_font,
+            anchor="mm",
+        )
+
+    for row, week in enumerate(weeks):
+        for column, day in enumerate(week):
+            left = CELL_WIDTH * column
+            top = grid_top + CELL_HEIGHT * row
+            box = (left + 2, top + 2, left + CELL_WIDTH - 2, top + CELL_HEIGHT - 2)
+            if not day:
+                draw.rectangle(box, CELL_OUTSIDE)
+                continue
+            draw.rectangle(box, CELL, outline=TODAY if day == today else None, width=2)
+            draw.text((left + PADDING + 2, top + PADDING), str(day), TEXT, day_font)
+
+            events = days.get(day, [])
+            shown = (
+                events
+                if len(events) <= MAX_EVENTS_PER_CELL
+                else events[: MAX_EVENTS_PER_CELL - 1]
+            )
+            y = top + PADDING + 24
+            for time, event_title, event_type in shown:
+                color = TYPE_COLORS.get(event_type, TYPE_COLORS["other"])
+                draw.rounded_rectangle(
+                    (
+                        left + PADDING,
+                        y,
+                        left + CELL_WIDTH - PADDING,
+                        y + LINE_HEIGHT - 2,
+                    ),
+                    4,
+                    color,
+                )
+                label = f"{time} {event_title}" if time else event_title
+                draw.text(
+                    (left + PADDING + 4, y + 2),
+                    _fit(draw, label, event_font, CELL_WIDTH - 2 * PADDING - 8),
+                    (255, 255, 255),
+                    event_font,
+                )
+                y += LINE_HEIGHT
+            if len(shown) < len(events):
+                draw.text(
+                    (left + PADDING + 4, y + 2),
+                    f"+{len(events) - len(shown)}",
+                    TEXT_MUTED,
+                    event_font,
+                )
+
+    x = PADDING * 2
+    legend_y = height - LEGEND_HEIGHT / 2
+    for event_type, color in TYPE_COLORS.items():
+        draw.rounded_rectangle((x, legend_y - 7, x + 14, legend_y + 7), 3, color)
+        label = type_labels.get(event_type, event_type)
+        draw.text((x + 20, legend_y), label, TEXT_MUTED, event_font, anchor="lm")
+        x += 20 + draw.textlength(label, font=event_font) + 24
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,80 @@
+import unicodedata
+from collections import Counter
+from typing import Optional
+
+# litery, których NFKD nie rozkłada na literę bazową + znak diakrytyczny
+_FOLD_TABLE = str.maketrans({"ł": "l", "Ł": "l", "ß": "ss"})
+
+
+def fold(text: str) -> str:
+    """Lowercase, without diacritics ("Kołokwium" -> "kolokwium")."""
+    text = unicodedata.normalize("NFKD", text.translate(_FOLD_TABLE).lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def trigrams(text: str) -> set[str]:
+    grams = set()
+    for word in fold(text).split():
+        word = f"  {word} "
+        grams.update(word[i : i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index over short documents (event title + message),
+    updated one document at a time.
+    """
+
+    def __init__(self):
+        self._postings: dict[str, set[int]] = {}
+        self._documents: dict[int, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, doc_id: int, text: str) -> None:
+        self.remove(doc_id)
+        grams = trigrams(text)
+        self._documents[doc_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id: int) -> None:
+        for gram in self._documents.pop(doc_id, ()):
+            postings = self._postings.get(gram)
+            if postings is None:
+                continue
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[gram]
+
+    def search(
+        self, query: str, limit: int = 5, threshold: float = 0.5
+    ) -> list[tuple[int, float]]:
+        """
+        Returns up to `limit` (doc_id, score) pairs, best first. The score is
+        the share of query trigrams found in the document, so a misspelt word
+        still matches a longer title; ties go to the shorter document.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        shared: Counter = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+
+        results = []
+        for doc_id, count in shared.items():
+            score = count / len(query_grams)
+            if score < threshold:
+                continue
+            dice = 2 * count / (len(query_grams) + len(self._documents[doc_id]))
+            results.append((-score, -dice, doc_id))
+        results.sort()
+        return [(doc_id, -score) for score, _, doc_id in results[:limit]]
+
+
+def event_text(title: str, message: Optional[str]) -> str:
+    return f"{title} {message}" if message else title
@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight computation: the
+    first caller runs `factory`, later ones await its result (or exception).
+    Nothing is kept once the computation finishes.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        if key in self._calls:
+            self.shared += 1
+            # anulowanie jednego czekającego nie przerywa wspólnego obliczenia
+            return await asyncio.shield(self._calls[key])
+
+        self.started += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # bez czekających wyjątek i tak trafia do wywołującego
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+class GuildLimiter:
+    """At most `limit` concurrent holders per guild, the rest wait in order."""
+
+    def __init__(self, limit: int = 2):
+        self.limit = limit
+        self._semaphores: dict[int, asyncio.Semaphore] = {}
+        self._holders: dict[int, int] = {}
+
+    @asynccontextmanager
+    async def __call__(self, guild_id: int) -> AsyncIterator[None]:
+        semaphore = self._semaphores.setdefault(guild_id, asyncio.Semaphore(self.limit))
+        self._holders[guild_id] = self._holders.get(guild_id, 0) + 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._holders[guild_id] -= 1
+            # semafory bezczynnych serwerów nie zostają w pamięci
+            if not self._holders[guild_id]:
+                del self._holders[guild_id]
+                del self._semaphores[guild_id]
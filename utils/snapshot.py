@@ -0,0 +1,47 @@
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+### snapshot ciepłego startu ###
+# zapisywany przy zamykaniu bota, wczytywany przy starcie; wpisy z danymi
+# serwerów niosą wersję danych (GuildDataVersion) i są odrzucane, jeśli się
+# zmieniła, więc stary snapshot nigdy nie podaje nieaktualnych danych
+#######################
+
+SNAPSHOT_FORMAT = 1
+
+
+def write_snapshot(path: str, state: dict[str, Any]) -> None:
+    data = {"format": SNAPSHOT_FORMAT, "created": time.time(), "state": state}
+    temp_path = f"{path}.tmp"
+    with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    # podmiana atomowa, przerwany zapis nie psuje poprzedniego snapshotu
+    os.replace(temp_path, path)
+
+
+def read_snapshot(path: str, max_age: float = 7 * 24 * 60 * 60) -> Optional[dict]:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"warm start snapshot {path} is unreadable: {e}")
+        return None
+    if data.get("format") != SNAPSHOT_FORMAT:
+        return None
+    if time.time() - data.get("created", 0) > max_age:
+        return None
+    return data.get("state") or {}
+
+
+def file_stamp(path: str) -> list[int]:
+    """Changes whenever the file is modified, used to validate cached copies."""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
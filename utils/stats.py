@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+from typing import Iterable
+
+import numpy as np
+
+# kolejność kolumn w tablicach statystyk
+STATS_TYPES = ("test", "exam", "retake", "deadline", "other")
+EXAM_TYPES = ("test", "exam", "retake")
+
+
+class CalendarStats:
+    """
+    Event load of a guild over `weeks` weeks from `start`, computed from
+    aggregated (day, event_type, role_id, count) rows (see `event_counts`) with
+    array operations over the day axis.
+    """
+
+    def __init__(
+        self, start: date, weeks: int, rows: Iterable[tuple[int, str, int, int]]
+    ):
+        self.start = start
+        self.weeks = weeks
+        # dzień x typ wydarzenia
+        self.per_day = np.zeros((weeks * 7, len(STATS_TYPES)), dtype=np.int64)
+        self.role_ids = np.zeros(0, dtype=np.int64)
+        # rola x tydzień, tylko kolokwia i egzaminy
+        self.role_weeks = np.zeros((0, weeks), dtype=np.int64)
+
+        rows = list(rows)
+        if not rows:
+            return
+        days, types, roles, counts = zip(*rows)
+        days = np.array(days, dtype=np.int64)
+        roles = np.array(roles, dtype=np.int64)
+        counts = np.array(counts, dtype=np.int64)
+
+        names, inverse = np.unique(np.array(types), return_inverse=True)
+        columns = np.array(
+            [
+                STATS_TYPES.index(name if name in STATS_TYPES else "other")
+                for name in names
+            ]
+        )
+        columns = columns[inverse]
+
+        valid = (days >= 0) & (days < weeks * 7)
+        np.add.at(self.per_day, (days[valid], columns[valid]), counts[valid])
+
+        exams = valid & np.isin(columns, [STATS_TYPES.index(t) for t in EXAM_TYPES])
+        self.role_ids, role_index = np.unique(roles[exams], return_inverse=True)
+        self.role_weeks = np.zeros((len(self.role_ids), weeks), dtype=np.int64)
+        np.add.at(self.role_weeks, (role_index, days[exams] // 7), counts[exams])
+
+    @property
+    def end(self) -> date:
+        return self.start + timedelta(days=self.weeks * 7 - 1)
+
+    @property
+    def total(self) -> int:
+        return int(self.per_day.sum())
+
+    @property
+    def per_week_day(self) -> np.ndarray:
+        """Events per day, shape (weeks, 7)."""
+        return self.per_day.sum(axis=1).reshape(self.weeks, 7)
+
+    @property
+    def per_week(self) -> np.ndarray:
+        """Events per week and type, shape (weeks, len(STATS_TYPES))."""
+        return self.per_day.reshape(self.weeks, 7, -1).sum(axis=1)
+
+    def per_type(self) -> dict[str, int]:
+        return dict(zip(STATS_TYPES, self.per_day.sum(axis=0).tolist()))
+
+    def busiest_weeks(self, limit: int = 3) -> list[tuple[date, int]]:
+        totals = self.per_week.sum(axis=1)
+        order = np.argsort(-totals, kind="stable")[:limit]
+        return [
+            (self.start + timedelta(weeks=int(week)), int(totals[week]))
+            for week in order
+            if totals[week]
+        ]
+
+    def exam_density(self) -> list[tuple[int, int, float, int]]:
+        """(role_id, exams, mean per week, busiest week) rows, most exams first."""
+        totals = self.role_weeks.sum(axis=1)
+        means = totals / self.weeks
+        peaks = self.role_weeks.max(axis=1, initial=0)
+        order = np.argsort(-totals, kind="stable")
+        return [
+            (int(self.role_ids[i]), int(totals[i]), float(means[i]), int(peaks[i]))
+            for i in order
+        ]
@@ -0,0 +1,103 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHeap:
+    """
+    Many timers (one per key) driven by a single task and a min-heap of fire
+    times (UTC epoch). Scheduling a key again replaces its previous time; the
+    old heap entry stays behind and is skipped when it reaches the top, so an
+    update costs O(log n) instead of a heap rebuild.
+
+    Due timers call `callback(key)`, at most `concurrency` at once. Callbacks
+    that want to repeat schedule their key again.
+    """
+
+    # górna granica snu, żeby przestawienie zegara nie opóźniło timerów
+    MAX_SLEEP = 60.0
+
+    def __init__(
+        self, callback: Callable[[Hashable], Awaitable[None]], concurrency: int = 4
+    ):
+        self.callback = callback
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._entries: dict[Hashable, tuple[float, int]] = {}
+        self._counter = 0
+        self._changed = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def when(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def schedule(self, key: Hashable, when: float) -> None:
+        self._counter += 1
+        self._entries[key] = (when, self._counter)
+        heapq.heappush(self._heap, (when, self._counter, key))
+        if self._heap[0][1] == self._counter:
+            # nowy najwcześniejszy timer, pętla musi skrócić sen
+            self._changed.set()
+
+    def cancel(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+        for task in self._running:
+            task.cancel()
+
+    def _drop_stale(self):
+        # przewaga nieaktualnych wpisów, np. po wielu zmianach konfiguracji
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (when, order, key) for key, (when, order) in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+        while self._heap:
+            when, order, key = self._heap[0]
+            if self._entries.get(key) == (when, order):
+                return
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._drop_stale()
+            self._changed.clear()
+            if not self._heap:
+                await self._changed.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait(), min(delay, self.MAX_SLEEP)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, key = heapq.heappop(self._heap)
+            del self._entries[key]
+            task = asyncio.create_task(self._fire(key))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key: Hashable):
+        async with self._semaphore:
+            try:
+                await self.callback(key)
+            except Exception:
+                logger.exception(f"timer {key!r} failed")
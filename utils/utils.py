@@ -1,5 +1,7 @@
-from datetime import datetime
+from datetime import datetime, date as dtdate, time as dttime, timedelta, tzinfo
+from calendar import monthrange
 import json
+import re
 from typing import Optional, Any
 import logging
 from colored import fg, attr
@@ -11,6 +13,8 @@ from discord.app_commands import locale_str, TranslationContextTypes, Translator
 from discord.app_commands.translator import OtherTranslationContext
 from discord.enums import Locale
 
+from utils.snapshot import file_stamp
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,10 +22,20 @@ class JSONTranslator(Translator):
     def __init__(self):
         self.translations_path = path.join("configs", "langs.json")
         self.translations = None
+        self.stamp = None
+
+    def preload(self, translations: dict, stamp: list[int]) -> None:
+        """Catalog from the warm start snapshot, used if langs.json is unchanged."""
+        self.translations = translations
+        self.stamp = stamp
 
     async def load(self) -> None:
+        stamp = file_stamp(self.translations_path)
+        if self.translations is not None and self.stamp == stamp:
+            return
         with open(self.translations_path, "r", encoding="utf-8") as f:
             self.translations = json.load(f)
+        self.stamp = stamp
         print("translations loaded")
 
     async def unload(self) -> None:
@@ -141,3 +155,128 @@ async def datetime_to_words(
     translator: JSONTranslator, locale: discord.Locale, date: datetime
 ) -> str:
     return f"{date.day} {await translator.translate(string=locale_str(f'month_{date.month}'), locale=locale)} {date.year}"
+
+
+_DATE_DMY = re.compile(r"(\d{1,2})[./-](\d{1,2})(?:[./-](\d{4}))?\.?")
+_DATE_ISO = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+_TIME = re.compile(r"(\d{1,2})[:.](\d{2})")
+_RELATIVE = re.compile(r"\+\s*(\d{1,3})\s*([dtw])")
+
+_RELATIVE_DAYS = {
+    "dziś": 0,
+    "dzis": 0,
+    "dzisiaj": 0,
+    "today": 0,
+    "jutro": 1,
+    "tomorrow": 1,
+    "pojutrze": 2,
+    "dayaftertomorrow": 2,
+}
+_WEEKDAYS = {
+    "poniedziałek": 0,
+    "poniedzialek": 0,
+    "pon": 0,
+    "wtorek": 1,
+    "wt": 1,
+    "środa": 2,
+    "sroda": 2,
+    "śr": 2,
+    "sr": 2,
+    "czwartek": 3,
+    "czw": 3,
+    "piątek": 4,
+    "piatek": 4,
+    "pt": 4,
+    "sobota": 5,
+    "sob": 5,
+    "niedziela": 6,
+    "nd": 6,
+    "ndz": 6,
+}
+
+
+# `DD.MM` starsze o więcej niż tyle dni oznacza datę w przyszłym roku
+# (w grudniu "05.01" to styczeń, a nie miniony styczeń)
+_PAST_GRACE = timedelta(days=30)
+
+
+def _valid_date(year: int, month: int, day: int) -> Optional[dtdate]:
+    if not (1 <= year <= 9999 and 1 <= month <= 12):
+        return None
+    if not 1 <= day <= monthrange(year, month)[1]:
+        return None
+    return dtdate(year, month, day)
+
+
+def parse_date(text: Optional[str], today: Optional[dtdate] = None) -> Optional[dtdate]:
+    """
+    Parses `DD.MM.RRRR`, `DD.MM` (current year, or the next one if the date
+    is more than 30 days in the past), `RRRR-MM-DD`, `+3d`/`+2t`
+    (days/weeks from today), `dziś`/`jutro`/`pojutrze` and weekday names (next
+    such day, today included). Returns None instead of raising on invalid input.
+    """
+    if not text:
+        return None
+    text = text.strip().lower()
+    today = today or datetime.now().date()
+
+    if text in _RELATIVE_DAYS:
+        return today + timedelta(days=_RELATIVE_DAYS[text])
+    if text in _WEEKDAYS:
+        return today + timedelta(days=(_WEEKDAYS[text] - today.weekday()) % 7)
+
+    if match := _DATE_DMY.fullmatch(text):
+        day, month, year = match.groups()
+        if year:
+            return _valid_date(int(year), int(month), int(day))
+        parsed = _valid_date(today.year, int(month), int(day))
+        if parsed and parsed < today - _PAST_GRACE:
+            return _valid_date(today.year + 1, int(month), int(day)) or parsed
+        return parsed
+    if match := _DATE_ISO.fullmatch(text):
+        year, month, day = match.groups()
+        return _valid_date(int(year), int(month), int(day))
+    if match := _RELATIVE.fullmatch(text):
+        amount, unit = match.groups()
+        return today + timedelta(days=int(amount) * (1 if unit == "d" else 7))
+    return None
+
+
+def parse_time(text: Optional[str]) -> Optional[dttime]:
+    """Parses `GG:MM` (or `GG.MM`), returns None on invalid input."""
+    if not text:
+        return None
+    match = _TIME.fullmatch(text.strip())
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return None
+    return dttime(hour=hour, minute=minute)
+
+
+def next_daily(hour: int, tz: tzinfo, now: Optional[datetime] = None) -> datetime:
+    """Next `hour` o'clock in `tz` strictly after `now`."""
+    now = (now or datetime.now(tz)).astimezone(tz)
+    candidate = datetime.combine(now.date(), dttime(hour=hour), tzinfo=tz)
+    if candidate <= now:
+        candidate = datetime.combine(
+            now.date() + timedelta(days=1), dttime(hour=hour), tzinfo=tz
+        )
+    return candidate
+
+
+def next_weekly(
+    weekday: int, hour: int, tz: tzinfo, now: Optional[datetime] = None
+) -> datetime:
+    """Next `weekday` (0 = Monday) at `hour` in `tz` strictly after `now`."""
+    now = (now or datetime.now(tz)).astimezone(tz)
+    candidate = datetime.combine(
+        now.date() + timedelta(days=(weekday - now.weekday()) % 7),
+        dttime(hour=hour),
+        tzinfo=tz,
+    )
+    if candidate <= now:
+        # arytmetyka na czasie lokalnym, więc zmiana czasu nie przesuwa godziny
+        candidate += timedelta(days=7)
+    return candidate